@@ -0,0 +1,173 @@
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+import math
+import os
+import tempfile
+
+# Largest atlas edge we will produce
+MAX_ATLAS_SIZE = 8192
+
+# Disk budget for built atlases (PNG plus layout); least recently used go first
+ATLAS_CACHE_MAX_BYTES = int(os.getenv("ATLAS_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+class AtlasPackingError(ValueError):
+    pass
+
+def atlas_cache_key(content_hashes: List[str], padding: int, power_of_two: bool, max_size: int) -> str:
+    """Cache key for an atlas: the sorted, de-duplicated content hashes plus packing options"""
+    payload = json.dumps({
+        "hashes": sorted(set(content_hashes)),
+        "padding": padding,
+        "power_of_two": power_of_two,
+        "max_size": max_size,
+    }, separators=(",", ":"), sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def _next_power_of_two(value: int) -> int:
+    return 1 << max(value - 1, 0).bit_length()
+
+def _skyline_pack(sizes: List[Tuple[int, int]], bin_width: int) -> Optional[Tuple[List[Tuple[int, int]], int]]:
+    """
+    Bottom-left skyline packing of rectangles into a bin of fixed width.
+
+    The skyline is a list of [x, y, width] segments describing the top edge of
+    everything placed so far. Each rectangle goes where its top edge ends up
+    lowest (ties broken by the leftmost position). Returns the positions in
+    input order and the resulting height, or None if a rectangle is wider
+    than the bin.
+    """
+    skyline = [[0, 0, bin_width]]
+    positions = [None] * len(sizes)
+    # Place tall rectangles first; it packs noticeably tighter
+    order = sorted(range(len(sizes)), key=lambda i: (sizes[i][1], sizes[i][0]), reverse=True)
+
+    for index in order:
+        width, height = sizes[index]
+        best = None
+        for start, segment in enumerate(skyline):
+            x = segment[0]
+            if x + width > bin_width:
+                break
+            # The rectangle rests on the highest segment it spans
+            y = 0
+            remaining = width
+            span = start
+            while remaining > 0:
+                y = max(y, skyline[span][1])
+                remaining -= skyline[span][2]
+                span += 1
+            if best is None or (y + height, x) < (best[0] + height, best[1]):
+                best = (y, x, start)
+        if best is None:
+            return None
+
+        y, x, start = best
+        positions[index] = (x, y)
+
+        # Raise the skyline under the new rectangle, trimming covered segments
+        new_segment = [x, y + height, width]
+        end = x + width
+        span = start
+        while span < len(skyline) and skyline[span][0] < end:
+            segment = skyline[span]
+            segment_end = segment[0] + segment[2]
+            if segment_end <= end:
+                del skyline[span]
+            else:
+                segment[2] = segment_end - end
+                segment[0] = end
+                break
+        skyline.insert(start, new_segment)
+
+        # Merge neighbours at the same height
+        merged = [skyline[0]]
+        for segment in skyline[1:]:
+            if segment[1] == merged[-1][1]:
+                merged[-1][2] += segment[2]
+            else:
+                merged.append(segment)
+        skyline = merged
+
+    return positions, max((segment[1] for segment in skyline), default=0)
+
+def pack_rectangles(sizes: List[Tuple[int, int]], max_size: int, power_of_two: bool):
+    """
+    Choose an atlas width and pack the rectangles into it.
+
+    A handful of candidate widths between the widest rectangle and max_size
+    are tried and the one giving the smallest atlas area wins.
+    """
+    if not sizes:
+        raise AtlasPackingError("Nothing to pack")
+    widest = max(width for width, _ in sizes)
+    if widest > max_size or max(height for _, height in sizes) > max_size:
+        raise AtlasPackingError(f"A sprite is larger than the {max_size}px atlas limit")
+
+    area = sum(width * height for width, height in sizes)
+    candidates = {widest, max_size}
+    side = max(widest, int(math.ceil(math.sqrt(area))))
+    for factor in (1.0, 1.25, 1.5, 2.0):
+        candidates.add(min(max_size, max(widest, int(side * factor))))
+    if power_of_two:
+        candidates = {min(_next_power_of_two(width), max_size) for width in candidates if width >= widest}
+
+    best = None
+    for bin_width in sorted(candidates):
+        packed = _skyline_pack(sizes, bin_width)
+        if packed is None:
+            continue
+        positions, height = packed
+        width = bin_width if power_of_two else max(x + w for (x, _), (w, _) in zip(positions, sizes))
+        if power_of_two:
+            height = _next_power_of_two(height)
+        if height > max_size:
+            continue
+        if best is None or width * height < best[0] * best[1]:
+            best = (width, height, positions)
+
+    if best is None:
+        raise AtlasPackingError(f"Sprites do not fit in a {max_size}x{max_size} atlas")
+    return best
+
+def build_atlas(entries: List[Tuple[str, str]], padding: int, power_of_two: bool,
+                max_size: int, output_path: str) -> Dict:
+    """
+    Packs and composites sprites into a PNG atlas written to output_path.
+
+    entries is a list of (content hash, file path) pairs. Runs in a worker
+    process: Pillow is imported here so the API process never pays for it.
+    The PNG and its JSON frame map are written through temp files and
+    renamed into place, so a concurrent reader never sees a partial atlas.
+    """
+    from PIL import Image
+
+    images = []
+    for content_hash, path in entries:
+        # Image.open only parses the header; pixels are decoded on paste
+        images.append((content_hash, Image.open(path)))
+
+    sizes = [(image.width + 2 * padding, image.height + 2 * padding) for _, image in images]
+    width, height, positions = pack_rectangles(sizes, max_size, power_of_two)
+
+    atlas = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    frames = {}
+    for (content_hash, image), (x, y) in zip(images, positions):
+        with image:
+            atlas.paste(image.convert("RGBA"), (x + padding, y + padding))
+        frames[content_hash] = {"x": x + padding, "y": y + padding, "w": image.width, "h": image.height}
+
+    layout = {"width": width, "height": height, "frames": frames}
+
+    directory = os.path.dirname(output_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_image = tempfile.mkstemp(dir=directory, suffix=".png.part")
+    with os.fdopen(fd, "wb") as f:
+        atlas.save(f, "PNG", optimize=False)
+    fd, temp_layout = tempfile.mkstemp(dir=directory, suffix=".json.part")
+    with os.fdopen(fd, "w") as f:
+        json.dump(layout, f)
+    # Publish the image before the layout: the layout's presence marks a complete entry
+    os.replace(temp_image, output_path)
+    os.replace(temp_layout, output_path[:-len(".png")] + ".json")
+    return layout
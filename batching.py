@@ -0,0 +1,93 @@
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import os
+
+if TYPE_CHECKING:
+    from pymongo.errors import BulkWriteError
+
+# Group commit for single-document inserts (opt-in)
+SCORE_GROUP_COMMIT = os.getenv("SCORE_GROUP_COMMIT", "0").lower() in ("1", "true", "yes")
+SCORE_GROUP_COMMIT_MAX_DELAY_MS = float(os.getenv("SCORE_GROUP_COMMIT_MAX_DELAY_MS", "5"))
+SCORE_GROUP_COMMIT_MAX_BATCH = int(os.getenv("SCORE_GROUP_COMMIT_MAX_BATCH", "100"))
+
+def write_errors_by_index(error: "BulkWriteError") -> Dict[int, Dict[str, Any]]:
+    """Map each failed document's position in the batch to its write error"""
+    return {write_error["index"]: write_error for write_error in error.details.get("writeErrors", [])}
+
+class GroupCommitWriter:
+    """
+    Coalesces concurrent insert_one calls into insert_many round trips.
+
+    Inserts are buffered until max_batch documents are waiting or max_delay
+    seconds have passed since the first one, then flushed as a single
+    unordered insert_many. Each caller awaits a future that resolves to its
+    own inserted _id, or raises its own write error. on_commit, if given,
+    receives the documents that were stored, once per flush.
+    """
+    def __init__(self, collection, max_batch: int = SCORE_GROUP_COMMIT_MAX_BATCH,
+                 max_delay: float = SCORE_GROUP_COMMIT_MAX_DELAY_MS / 1000,
+                 on_commit: Optional[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = None):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.on_commit = on_commit
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes = set()
+
+    async def insert(self, document: Dict[str, Any]):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((document, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            # Hold a reference so the flush task is not garbage collected
+            task = asyncio.get_running_loop().create_task(self._commit(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _commit(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        from pymongo.errors import BulkWriteError, WriteError
+
+        documents = [document for document, _ in batch]
+        errors: Dict[int, Dict[str, Any]] = {}
+        try:
+            await self.collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            errors = write_errors_by_index(e)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if self.on_commit is not None:
+            try:
+                await self.on_commit([document for index, document in enumerate(documents) if index not in errors])
+            except Exception as e:
+                print(f"Group commit callback failed: {str(e)}")
+
+        for index, (document, future) in enumerate(batch):
+            if future.done():
+                continue
+            if index in errors:
+                error = errors[index]
+                future.set_exception(WriteError(error.get("errmsg", "Write failed"), error.get("code"), error))
+            else:
+                future.set_result(document["_id"])
+
+    async def close(self):
+        """Flush anything still buffered and wait for in-flight flushes"""
+        self._flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
@@ -0,0 +1,87 @@
+"""
+Minimal in-process ASGI client for the benchmark suite.
+
+Calls the application object directly with a hand-built scope, so the
+numbers measure the app and its middleware rather than an HTTP client or
+socket. Response bodies are collected in full, including streamed ones.
+"""
+import asyncio
+from typing import Dict, Iterable, List, Optional, Tuple
+
+class Response:
+    def __init__(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes):
+        self.status = status
+        self.raw_headers = headers
+        self.body = body
+
+    def header(self, name: str) -> Optional[str]:
+        wanted = name.lower().encode()
+        for key, value in self.raw_headers:
+            if key.lower() == wanted:
+                return value.decode("latin-1")
+        return None
+
+async def request(app, method: str, path: str, headers: Iterable[Tuple[str, str]] = (),
+                  body: bytes = b"", client: Tuple[str, int] = ("127.0.0.1", 50000),
+                  chunk_size: int = 64 * 1024) -> Response:
+    """Send one request through app and return the complete response"""
+    raw_path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": raw_path,
+        "raw_path": raw_path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(key.lower().encode("latin-1"), value.encode("latin-1")) for key, value in headers]
+                   + [(b"host", b"bench"), (b"content-length", str(len(body)).encode())],
+        "client": client,
+        "server": ("bench", 80),
+    }
+
+    # The body is delivered in chunks, as a server would for uploads
+    chunks = [body[offset:offset + chunk_size] for offset in range(0, len(body), chunk_size)] or [b""]
+    position = 0
+    finished = asyncio.Event()
+
+    async def receive() -> Dict:
+        nonlocal position
+        if position < len(chunks):
+            chunk = chunks[position]
+            position += 1
+            return {"type": "http.request", "body": chunk, "more_body": position < len(chunks)}
+        # Like a server, only report the disconnect once the response is complete
+        # (BaseHTTPMiddleware cancels the response if it sees one earlier)
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    status = 0
+    response_headers: List[Tuple[bytes, bytes]] = []
+    parts: List[bytes] = []
+
+    async def send(message: Dict):
+        nonlocal status, response_headers
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers = list(message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            parts.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                finished.set()
+
+    await app(scope, receive, send)
+    finished.set()
+    return Response(status, response_headers, b"".join(parts))
+
+def multipart(field: str, filename: str, content: bytes, content_type: str) -> Tuple[bytes, str]:
+    """Encode one file as a multipart/form-data body; returns (body, content type header)"""
+    boundary = "benchmarkboundary7MA4YWxkTrZu0gW"
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
@@ -0,0 +1,55 @@
+"""
+Benchmark for sprite dimension extraction.
+
+Compares media.probe_image_dimensions (header-only parse) with a full
+Pillow decode of the same PNG, GIF and JPEG files.
+
+Requires Pillow to generate the sample images. Run from the repository root:
+    python benchmarks/bench_image_probe.py
+"""
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from media import probe_image_dimensions
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+SIZES = [(64, 64), (512, 512), (2048, 2048)]
+
+def write_samples(directory: str):
+    samples = []
+    for width, height in SIZES:
+        image = Image.effect_noise((width, height), 64).convert("RGB")
+        for extension, pil_format in (("png", "PNG"), ("gif", "GIF"), ("jpg", "JPEG")):
+            path = os.path.join(directory, f"sample_{width}x{height}.{extension}")
+            image.save(path, pil_format)
+            samples.append((path, extension, width, height))
+    return samples
+
+def full_decode(path: str):
+    with Image.open(path) as image:
+        image.load()
+        return image.size
+
+def main(iterations: int = 200):
+    if Image is None:
+        print("Pillow is not installed; install it to generate benchmark images")
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'file':<28} {'probe':>12} {'full decode':>14} {'speedup':>9}")
+        for path, extension, width, height in write_samples(directory):
+            assert probe_image_dimensions(path, extension) == (width, height)
+            probe = timeit.timeit(lambda: probe_image_dimensions(path, extension), number=iterations) / iterations
+            decode = timeit.timeit(lambda: full_decode(path), number=max(iterations // 20, 1)) / max(iterations // 20, 1)
+            print(f"{os.path.basename(path):<28} {probe * 1e6:9.1f} us {decode * 1e6:11.1f} us {decode / probe:8.0f}x")
+
+if __name__ == "__main__":
+    main()
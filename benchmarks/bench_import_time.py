@@ -0,0 +1,59 @@
+"""
+Cold-start budget check for the app entry point.
+
+Imports main in a fresh interpreter under `python -X importtime`, reports
+the total and the slowest modules, and fails (exit status 1) if the import
+exceeds the budget or pulls in a dependency that should only load on first
+use (Motor/pymongo, NumPy, Pillow).
+
+Run from the repository root:
+    python benchmarks/bench_import_time.py [budget_ms]
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Total import time allowed for `import main`, in milliseconds
+DEFAULT_BUDGET_MS = 500
+
+# Modules that must not be imported until a request needs them
+DEFERRED_MODULES = ("motor", "pymongo", "numpy", "PIL")
+
+def measure():
+    """Return ({module: (self_us, cumulative_us)}, modules loaded) for a cold import of main"""
+    probe = "import main, sys; print(','.join(sorted(sys.modules)))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", probe],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings, set(result.stdout.strip().split(","))
+
+def main(budget_ms: float = DEFAULT_BUDGET_MS, runs: int = 5):
+    totals = []
+    for _ in range(runs):
+        timings, loaded = measure()
+        totals.append(timings["main"][1] / 1000)
+    total = sorted(totals)[len(totals) // 2]
+
+    print(f"import main: {total:.1f} ms (median of {runs}, budget {budget_ms:.0f} ms)")
+    print("slowest modules (self time):")
+    for name, (self_us, _) in sorted(timings.items(), key=lambda item: -item[1][0])[:10]:
+        print(f"  {name:<40} {self_us / 1000:7.1f} ms")
+
+    eager = [name for name in DEFERRED_MODULES if name in loaded]
+    if eager:
+        print(f"FAIL: imported at startup: {', '.join(eager)}")
+    if total > budget_ms:
+        print("FAIL: import time over budget")
+    if eager or total > budget_ms:
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUDGET_MS)
@@ -0,0 +1,71 @@
+"""
+Benchmark for name autocomplete.
+
+Fills search.SearchIndex with synthetic asset names and reports p50/p99
+latency of typical type-ahead queries, prefix and fuzzy. First checks
+that misspelled queries still find the name they were meant to, and
+exits with status 1 if one does not.
+
+Run from the repository root:
+    python benchmarks/bench_search.py [number_of_names]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import SearchIndex, _build_indexes
+
+SUBJECTS = ["player", "enemy", "boss", "npc", "tile", "ui", "fx", "item", "sword", "coin"]
+ACTIONS = ["idle", "run", "walk", "jump", "attack", "hit", "die", "open", "spin", "glow"]
+
+QUERIES = ["p", "pla", "player_", "player_ru", "enmy", "bos_at", "sword_gl", "tile_0", "zzz"]
+
+# Misspelled queries and the name prefix their top fuzzy result should have
+TYPO_QUERIES = {"enmy": "enemy_", "plyer": "player_", "swrd": "sword_", "bos_at": "boss_attack"}
+
+def build_index(count: int) -> SearchIndex:
+    """Index synthetic names the way SearchIndex.rebuild does"""
+    random.seed(7)
+    index = SearchIndex()
+    entries = {kind: [] for kind in index.kinds}
+    for asset_id in range(count):
+        name = f"{random.choice(SUBJECTS)}_{random.choice(ACTIONS)}_{random.randint(0, 999):03d}"
+        entries[random.choice(index.kinds)].append((str(asset_id), name))
+    index.indexes = _build_indexes(entries)
+    return index
+
+def check_typo_queries(index: SearchIndex) -> bool:
+    """Report whether every TYPO_QUERIES entry finds its intended name"""
+    passed = True
+    for query, expected in TYPO_QUERIES.items():
+        results = index.search(query, None, 10)
+        found = results[0]["name"] if results else None
+        if found is None or not found.startswith(expected):
+            print(f"Typo query {query!r} should find {expected}..., got {found}")
+            passed = False
+    return passed
+
+def main(count: int = 100000, repeats: int = 500):
+    started = time.perf_counter()
+    index = build_index(count)
+    print(f"Indexed {count} names in {time.perf_counter() - started:.2f} s")
+    if not check_typo_queries(index):
+        sys.exit(1)
+
+    print(f"{'query':<12} {'p50':>10} {'p99':>10} {'results':>8}")
+    for query in QUERIES:
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            results = index.search(query, None, 10)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        p50 = timings[len(timings) // 2]
+        p99 = timings[int(len(timings) * 0.99)]
+        print(f"{query:<12} {p50 * 1e3:7.3f} ms {p99 * 1e3:7.3f} ms {len(results):8d}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
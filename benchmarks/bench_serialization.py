@@ -0,0 +1,65 @@
+"""
+Benchmark for list endpoint serialization.
+
+Times turning 1000 Mongo documents into a JSON response body the old way
+(stringify each _id, then FastAPI's jsonable_encoder, then json.dumps via
+JSONResponse) against responses.dumps_mongo (one orjson pass).
+
+Run from the repository root:
+    python benchmarks/bench_serialization.py
+"""
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from responses import dumps_mongo
+
+def sample_documents(count: int = 1000):
+    now = datetime.now()
+    documents = []
+    for index in range(count):
+        documents.append({
+            "_id": ObjectId(),
+            "name": f"sprite_{index}",
+            "file_path": f"/sprites/{index}/content",
+            "width": 64,
+            "height": 64,
+            "format": "png",
+            "tags": ["uploaded", "png", "characters"],
+            "description": f"Uploaded sprite: sprite_{index}.png",
+            "size": 4096 + index,
+            "sha256": "ab" * 32,
+            "blob_key": f"blobs/ab/{'ab' * 32}",
+            "price": Decimal128("1.99"),
+            "created_at": now - timedelta(seconds=index),
+            "updated_at": now,
+        })
+    return documents
+
+def previous_path(documents):
+    for document in documents:
+        document = dict(document)
+        document["_id"] = str(document["_id"])
+    encoded = jsonable_encoder(documents, custom_encoder={ObjectId: str, Decimal128: lambda value: str(value.to_decimal())})
+    return JSONResponse(content=encoded).body
+
+def main(iterations: int = 50):
+    documents = sample_documents()
+    size = len(dumps_mongo(documents))
+    before = timeit.timeit(lambda: previous_path(documents), number=iterations) / iterations
+    after = timeit.timeit(lambda: dumps_mongo(documents), number=iterations) / iterations
+    print(f"1000 documents, {size / 1024:.0f} KiB of JSON")
+    print(f"jsonable_encoder + json.dumps {before * 1e3:8.2f} ms")
+    print(f"orjson (dumps_mongo)          {after * 1e3:8.2f} ms")
+    print(f"speedup                       {before / after:8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Micro-benchmark for the request threat scanner used by security_middleware.
+
+Compares the old approach (nine re.search calls over the full URL per request)
+with the single precompiled alternation, and times the JSON body scan and the
+iterative sanitize_mongo_query on a deeply nested payload. First checks
+that every Content-Type FastAPI parses as JSON is routed to the body scan,
+and exits with status 1 if one is not.
+
+Run from the repository root:
+    python benchmarks/bench_threat_scanner.py
+"""
+import os
+import re
+import sys
+import json
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.requests import Request
+
+from security import scan_request_target, scan_request_body, sanitize_mongo_query, is_json_request
+
+LEGACY_PATTERNS = [
+    r'\$where', r'\$ne', r'\$gt', r'\$lt', r'\$regex', r'\$exists', r'\.\.\/', r'\/\.\.', r';'
+]
+
+SAMPLE_REQUESTS = [
+    ("/sprites/", "cursor=eyJhZnRlciI6IjY1ZjAwMDAwMDAwMDAwMDAwMDAwMDAwMCJ9&limit=100"),
+    ("/audio/65f000000000000000000000", ""),
+    ("/scores/top/10", ""),
+    ("/scores/", "query=%7B%27%24where%27%3A%27true%27%7D"),
+]
+
+SAMPLE_BODY = json.dumps({"player_name": "player_one", "score": 1500, "game_level": 3,
+                          "time_played": 1200.5}).encode()
+
+# Content-Type headers and whether FastAPI parses such a body as JSON
+CONTENT_TYPE_CASES = [
+    (None, True),
+    ("application/json", True),
+    ("application/json; charset=utf-8", True),
+    ("Application/JSON", True),
+    ("application/merge-patch+json", True),
+    ("APPLICATION/VND.API+JSON", True),
+    ("text/plain", False),
+    ("multipart/form-data; boundary=x", False),
+    ("application/x-www-form-urlencoded", False),
+]
+
+def check_json_content_types() -> bool:
+    """Report whether is_json_request agrees with FastAPI on every CONTENT_TYPE_CASES entry"""
+    passed = True
+    for content_type, expected in CONTENT_TYPE_CASES:
+        headers = [(b"content-type", content_type.encode())] if content_type is not None else []
+        request = Request({"type": "http", "method": "POST", "headers": headers})
+        if is_json_request(request) != expected:
+            print(f"Content-Type {content_type!r} should {'' if expected else 'not '}be scanned as JSON")
+            passed = False
+    return passed
+
+def legacy_scan(url: str) -> bool:
+    for pattern in LEGACY_PATTERNS:
+        if re.search(pattern, url, re.IGNORECASE):
+            return True
+    return False
+
+def nested_payload(depth: int):
+    payload = {"value": "leaf"}
+    for _ in range(depth):
+        payload = {"child": payload, "$where": "1"}
+    return payload
+
+def report(label: str, seconds: float, iterations: int):
+    print(f"{label:<40} {seconds / iterations * 1e6:8.2f} us/op")
+
+def main(iterations: int = 200000):
+    if not check_json_content_types():
+        sys.exit(1)
+
+    urls = [f"http://127.0.0.1:8000{path}?{query}" if query else f"http://127.0.0.1:8000{path}"
+            for path, query in SAMPLE_REQUESTS]
+
+    legacy = timeit.timeit(lambda: [legacy_scan(url) for url in urls], number=iterations)
+    report("legacy per-pattern re.search (URL)", legacy / len(urls), iterations)
+
+    compiled = timeit.timeit(lambda: [scan_request_target(path, query) for path, query in SAMPLE_REQUESTS],
+                             number=iterations)
+    report("compiled single-pass scan (URL)", compiled / len(urls), iterations)
+
+    body = timeit.timeit(lambda: scan_request_body(SAMPLE_BODY), number=iterations)
+    report("compiled JSON body scan", body, iterations)
+
+    deep = nested_payload(5000)
+    sanitize = timeit.timeit(lambda: sanitize_mongo_query(deep), number=20)
+    report("sanitize_mongo_query (depth 5000)", sanitize, 20)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+In-process stand-in for the Motor client, used by the benchmark suite.
+
+Implements the subset of the collection API the app calls (find with
+sort/skip/limit/projection, find_one, inserts, updates with upsert,
+deletes, bulk_write, aggregate with the stages filters.py and rollups.py
+use) over plain dicts, so routes can be driven without a MongoDB server.
+Every call yields to the event loop once, as a real round trip would, and
+documents are copied on the way in and out like BSON encoding does.
+
+Install it before the first request:
+
+    import config
+    config._client = FakeMotorClient()
+"""
+import asyncio
+import copy
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+def _get(document: Dict[str, Any], path: str) -> Any:
+    value: Any = document
+    for part in path.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            return None
+    return value
+
+def _condition_matches(value: Any, condition: Any) -> bool:
+    if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+        for operator, argument in condition.items():
+            if operator == "$gt":
+                if value is None or not value > argument:
+                    return False
+            elif operator == "$gte":
+                if value is None or not value >= argument:
+                    return False
+            elif operator == "$lt":
+                if value is None or not value < argument:
+                    return False
+            elif operator == "$lte":
+                if value is None or not value <= argument:
+                    return False
+            elif operator == "$ne":
+                if value == argument:
+                    return False
+            elif operator == "$in":
+                if isinstance(value, list):
+                    if not any(item in argument for item in value):
+                        return False
+                elif value not in argument:
+                    return False
+            elif operator == "$all":
+                if not isinstance(value, list) or not all(item in value for item in argument):
+                    return False
+            elif operator == "$exists":
+                if (value is not None) != bool(argument):
+                    return False
+            else:
+                raise NotImplementedError(operator)
+        return True
+    if isinstance(value, list) and not isinstance(condition, list):
+        return condition in value
+    return value == condition
+
+def matches(document: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(matches(document, clause) for clause in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, clause) for clause in condition):
+                return False
+        elif not _condition_matches(_get(document, key), condition):
+            return False
+    return True
+
+def _sort(documents: List[Dict[str, Any]], spec) -> List[Dict[str, Any]]:
+    for field, direction in reversed(list(spec)):
+        documents.sort(key=lambda document: (_get(document, field) is not None,
+                                             _get(document, field) if _get(document, field) is not None else 0),
+                       reverse=direction < 0)
+    return documents
+
+def _project(document: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not projection:
+        return document
+    included = {key for key, value in projection.items() if value}
+    if included:
+        return {key: value for key, value in document.items() if key in included or key == "_id"}
+    return {key: value for key, value in document.items() if key not in projection}
+
+class FakeCursor:
+    def __init__(self, collection: "FakeCollection", query: Dict[str, Any], projection=None):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort_spec: List = []
+        self._skip = 0
+        self._limit = 0
+        self._iterator = None
+
+    def sort(self, key, direction=None):
+        self._sort_spec = key if isinstance(key, list) else [(key, direction or 1)]
+        return self
+
+    def skip(self, count: int):
+        self._skip = count
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int):
+        return self
+
+    def _results(self) -> List[Dict[str, Any]]:
+        documents = [document for document in self._collection.documents.values() if matches(document, self._query)]
+        if self._sort_spec:
+            _sort(documents, self._sort_spec)
+        documents = documents[self._skip:]
+        if self._limit:
+            documents = documents[:self._limit]
+        return [_project(copy.deepcopy(document), self._projection) for document in documents]
+
+    async def to_list(self, length: Optional[int]):
+        await asyncio.sleep(0)
+        results = self._results()
+        return results if length is None else results[:length]
+
+    def __aiter__(self):
+        self._iterator = iter(self._results())
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+class FakeAggregation:
+    def __init__(self, collection: "FakeCollection", pipeline: List[Dict[str, Any]]):
+        self._collection = collection
+        self._pipeline = pipeline
+
+    async def to_list(self, length: Optional[int]):
+        await asyncio.sleep(0)
+        documents = [copy.deepcopy(document) for document in self._collection.documents.values()]
+        results = run_pipeline(documents, self._pipeline)
+        return results if length is None else results[:length]
+
+def run_pipeline(documents: List[Dict[str, Any]], pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    for stage in pipeline:
+        (operator, argument), = stage.items()
+        if operator == "$match":
+            documents = [document for document in documents if matches(document, argument)]
+        elif operator == "$project":
+            documents = [{key: value for key, value in document.items() if argument.get(key)} for document in documents]
+        elif operator == "$unwind":
+            field = argument.lstrip("$")
+            documents = [dict(document, **{field: value}) for document in documents for value in (document.get(field) or [])]
+        elif operator == "$sortByCount":
+            field = argument.lstrip("$")
+            counts: Dict[Any, int] = {}
+            for document in documents:
+                counts[document.get(field)] = counts.get(document.get(field), 0) + 1
+            documents = [{"_id": key, "count": count} for key, count in sorted(counts.items(), key=lambda item: -item[1])]
+        elif operator == "$facet":
+            documents = [{name: run_pipeline([copy.deepcopy(document) for document in documents], stages)
+                          for name, stages in argument.items()}]
+        elif operator == "$count":
+            documents = [{argument: len(documents)}] if documents else []
+        elif operator == "$sort":
+            _sort(documents, argument.items())
+        elif operator == "$limit":
+            documents = documents[:argument]
+        else:
+            raise NotImplementedError(operator)
+    return documents
+
+class FakeCollection:
+    def __init__(self, name: str):
+        self.name = name
+        self.documents: Dict[Any, Dict[str, Any]] = {}
+        self.indexes: List = []
+
+    def _first(self, query) -> Optional[Dict[str, Any]]:
+        for document in self.documents.values():
+            if matches(document, query):
+                return document
+        return None
+
+    def find(self, query=None, projection=None, **kwargs):
+        return FakeCursor(self, query or {}, projection)
+
+    async def find_one(self, query=None, projection=None, **kwargs):
+        await asyncio.sleep(0)
+        document = self._first(query or {})
+        return _project(copy.deepcopy(document), projection) if document is not None else None
+
+    async def insert_one(self, document):
+        await asyncio.sleep(0)
+        document.setdefault("_id", ObjectId())
+        if document["_id"] in self.documents:
+            raise DuplicateKeyError("duplicate key")
+        self.documents[document["_id"]] = copy.deepcopy(document)
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    async def insert_many(self, documents, ordered: bool = True):
+        await asyncio.sleep(0)
+        inserted = []
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+            self.documents[document["_id"]] = copy.deepcopy(document)
+            inserted.append(document["_id"])
+        return SimpleNamespace(inserted_ids=inserted)
+
+    def _apply_update(self, document: Dict[str, Any], update: Dict[str, Any], inserting: bool):
+        for operator, fields in update.items():
+            if operator == "$set" or (operator == "$setOnInsert" and inserting):
+                document.update(fields)
+            elif operator == "$inc":
+                for key, amount in fields.items():
+                    document[key] = document.get(key, 0) + amount
+            elif operator == "$unset":
+                for key in fields:
+                    document.pop(key, None)
+            elif operator == "$push":
+                for key, value in fields.items():
+                    array = document.setdefault(key, [])
+                    if isinstance(value, dict) and "$each" in value:
+                        array.extend(value["$each"])
+                        for field, direction in reversed(list(value.get("$sort", {}).items())):
+                            array.sort(key=lambda entry: entry.get(field), reverse=direction < 0)
+                        if "$slice" in value:
+                            del array[value["$slice"]:]
+                    else:
+                        array.append(value)
+            elif operator != "$setOnInsert":
+                raise NotImplementedError(operator)
+
+    def _upsert(self, query, update) -> Dict[str, Any]:
+        document = {key: value for key, value in query.items() if not key.startswith("$") and not isinstance(value, dict)}
+        self._apply_update(document, update, True)
+        document.setdefault("_id", ObjectId())
+        if document["_id"] in self.documents:
+            raise DuplicateKeyError("duplicate key")
+        self.documents[document["_id"]] = document
+        return document
+
+    async def update_one(self, query, update, upsert: bool = False):
+        await asyncio.sleep(0)
+        document = self._first(query)
+        if document is not None:
+            self._apply_update(document, update, False)
+            return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None)
+        if upsert:
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=self._upsert(query, update)["_id"])
+        return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+
+    async def update_many(self, query, update, upsert: bool = False):
+        await asyncio.sleep(0)
+        updated = 0
+        for document in self.documents.values():
+            if matches(document, query):
+                self._apply_update(document, update, False)
+                updated += 1
+        return SimpleNamespace(matched_count=updated, modified_count=updated)
+
+    async def find_one_and_update(self, query, update, upsert: bool = False, return_document=False, **kwargs):
+        await asyncio.sleep(0)
+        document = self._first(query)
+        if document is not None:
+            before = copy.deepcopy(document)
+            self._apply_update(document, update, False)
+            return copy.deepcopy(document) if return_document else before
+        if upsert:
+            document = self._upsert(query, update)
+            return copy.deepcopy(document) if return_document else None
+        return None
+
+    async def delete_one(self, query):
+        await asyncio.sleep(0)
+        document = self._first(query)
+        if document is None:
+            return SimpleNamespace(deleted_count=0)
+        del self.documents[document["_id"]]
+        return SimpleNamespace(deleted_count=1)
+
+    async def delete_many(self, query):
+        await asyncio.sleep(0)
+        doomed = [key for key, document in self.documents.items() if matches(document, query)]
+        for key in doomed:
+            del self.documents[key]
+        return SimpleNamespace(deleted_count=len(doomed))
+
+    async def find_one_and_delete(self, query, **kwargs):
+        await asyncio.sleep(0)
+        document = self._first(query)
+        if document is not None:
+            del self.documents[document["_id"]]
+        return document
+
+    async def bulk_write(self, operations, ordered: bool = True):
+        for operation in operations:
+            kind = type(operation).__name__
+            if kind == "UpdateOne":
+                await self.update_one(operation._filter, operation._doc, upsert=operation._upsert)
+            elif kind == "InsertOne":
+                await self.insert_one(operation._doc)
+            elif kind == "DeleteMany":
+                await self.delete_many(operation._filter)
+            else:
+                raise NotImplementedError(kind)
+        return SimpleNamespace()
+
+    def aggregate(self, pipeline):
+        return FakeAggregation(self, pipeline)
+
+    async def count_documents(self, query):
+        await asyncio.sleep(0)
+        return sum(1 for document in self.documents.values() if matches(document, query))
+
+    async def distinct(self, field: str, query=None):
+        await asyncio.sleep(0)
+        values: List[Any] = []
+        for document in self.documents.values():
+            if matches(document, query or {}):
+                value = _get(document, field)
+                for item in (value if isinstance(value, list) else [value]):
+                    if item not in values:
+                        values.append(item)
+        return values
+
+    async def create_index(self, keys, **kwargs):
+        self.indexes.append((keys, kwargs))
+        return str(keys)
+
+class FakeDatabase:
+    def __init__(self):
+        self.collections: Dict[str, FakeCollection] = {}
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(name)
+        return self.collections[name]
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def command(self, name: str, *args, **kwargs):
+        await asyncio.sleep(0)
+        return {"ok": 1.0}
+
+class FakeMotorClient:
+    """Stands in for AsyncIOMotorClient: client[database][collection]"""
+    def __init__(self):
+        self.databases: Dict[str, FakeDatabase] = {}
+        self.admin = FakeDatabase()
+
+    def __getitem__(self, name: str) -> FakeDatabase:
+        if name not in self.databases:
+            self.databases[name] = FakeDatabase()
+        return self.databases[name]
+
+    def close(self):
+        pass
@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from workers import SingleFlight
+import os
+import time
+
+def _setting(name: str, option: str, default: float) -> float:
+    """Per-collection override, e.g. CACHE_SPRITES_TTL_SECONDS"""
+    return float(os.getenv(f"CACHE_{name.upper()}_{option}", str(default)))
+
+class DocumentCache:
+    """
+    Read-through cache of documents looked up by ID.
+
+    A bounded LRU whose entries expire after ttl seconds. Lookups that found
+    nothing are cached too, for the shorter negative_ttl, so repeated 404s
+    do not each cost a query. Concurrent misses for one ID share a single
+    load. Setting max_entries or ttl to 0 turns the cache off.
+
+    Each worker process keeps its own cache, so a delete on one worker is
+    only seen by the others once their entry expires.
+    """
+    def __init__(self, name: str, max_entries: int = 10000, ttl: float = 300.0, negative_ttl: float = 5.0):
+        self.name = name
+        self.max_entries = int(_setting(name, "MAX_ENTRIES", max_entries))
+        self.ttl = _setting(name, "TTL_SECONDS", ttl)
+        self.negative_ttl = _setting(name, "NEGATIVE_TTL_SECONDS", negative_ttl)
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Optional[Dict[str, Any]]]]" = OrderedDict()
+        self._loads = SingleFlight()
+        # Bumped by invalidate() so a load already in flight is not cached
+        self._generation = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    async def get(self, key: Hashable, load: Callable[[], Awaitable[Optional[Dict[str, Any]]]]) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached document for key, calling load() on a miss.
+
+        Documents are shared between callers and must not be modified.
+        """
+        if not self.enabled:
+            return await load()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, document = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return document
+            del self._entries[key]
+        self.misses += 1
+
+        async def fill():
+            generation = self._generation
+            document = await load()
+            if generation == self._generation:
+                self._store(key, document)
+            return document
+
+        return await self._loads.run(key, fill)
+
+    def _store(self, key: Hashable, document: Optional[Dict[str, Any]]):
+        ttl = self.ttl if document is not None else self.negative_ttl
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, document)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+        self._generation += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._generation += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "negative_ttl_seconds": self.negative_ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None
+        }
+
+class BodyCache:
+    """
+    LRU of serialized response bodies bounded by their total size.
+
+    Sized in bytes rather than entries because bodies vary widely (a peak
+    envelope ranges from a few hundred bytes to about a megabyte). A body
+    larger than the whole budget is not cached.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[Hashable, bytes]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+        return body
+
+    def put(self, key: Hashable, body: bytes):
+        if len(body) > self.max_bytes or key in self._entries:
+            return
+        self._entries[key] = body
+        self.total_bytes += len(body)
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.total_bytes -= len(evicted)
+
+# One cache per collection; sizes and TTLs can be overridden from the environment
+sprite_cache = DocumentCache("sprites")
+audio_cache = DocumentCache("audio")
+score_cache = DocumentCache("scores", ttl=60.0)
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {cache.name: cache.stats() for cache in (sprite_cache, audio_cache, score_cache)}
@@ -0,0 +1,164 @@
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Dict, Optional, Tuple
+from cache import BodyCache
+import gzip
+import hashlib
+import os
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Bodies smaller than this are sent as they are
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+
+# Bodies larger than this are compressed in a worker thread
+COMPRESSION_THREAD_BYTES = int(os.getenv("COMPRESSION_THREAD_BYTES", str(64 * 1024)))
+
+# Memory budget for precompressed response bodies
+COMPRESSION_CACHE_MAX_BYTES = int(os.getenv("COMPRESSION_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Only text formats are worth compressing; stored media is already compressed
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+def available_encodings() -> Tuple[str, ...]:
+    """Supported encodings, most preferred first"""
+    return ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the supported encoding the client weights highest (ties go to our preference)"""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in available_encodings():
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+class CompressedBodyCache(BodyCache):
+    """
+    LRU of compressed bodies keyed by (encoding, digest of the plain body).
+
+    Keying on content rather than URL means a hit can never serve stale
+    bytes, and identical bodies behind different URLs share one entry.
+    Hashing is an order of magnitude cheaper than compressing.
+    """
+    def __init__(self, max_bytes: int = COMPRESSION_CACHE_MAX_BYTES):
+        super().__init__(max_bytes)
+
+class CompressionMiddleware:
+    """
+    Compresses complete text responses with zstd or gzip, as negotiated.
+
+    Streaming responses (NDJSON, blob downloads), media types, partial and
+    empty responses, and bodies under the size threshold pass through
+    untouched. Responses carrying an ETag are hot, cacheable payloads such
+    as catalogue listings and leaderboards, so their compressed bodies are
+    kept and reused instead of being recompressed on every request. Large
+    bodies are compressed off the event loop.
+    """
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_BYTES,
+                 thread_size: int = COMPRESSION_THREAD_BYTES, cache: Optional[CompressedBodyCache] = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_size = thread_size
+        self.cache = cache if cache is not None else CompressedBodyCache()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        passthrough = False
+
+        async def send_compressed(message: Message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = {**message, "headers": list(message.get("headers", []))}
+                return
+
+            # First body message: decide whether this response qualifies
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if (message.get("more_body", False) or len(body) < self.minimum_size
+                    or not self._compressible(start["status"], headers)):
+                passthrough = True
+                if headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES):
+                    headers.add_vary_header("Accept-Encoding")
+                await send(start)
+                await send(message)
+                return
+
+            compressed = await self._compress(body, encoding, cacheable="etag" in headers)
+            headers.add_vary_header("Accept-Encoding")
+            if len(compressed) >= len(body):
+                await send(start)
+                await send(message)
+                return
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            etag = headers.get("etag")
+            if etag is not None and not etag.startswith("W/"):
+                # The encoded bytes differ, so a strong validator no longer holds
+                headers["ETag"] = f"W/{etag}"
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    def _compressible(status: int, headers: MutableHeaders) -> bool:
+        return (status not in (204, 206, 304)
+                and "content-encoding" not in headers
+                and "content-range" not in headers
+                and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES))
+
+    async def _compress(self, body: bytes, encoding: str, cacheable: bool) -> bytes:
+        key = None
+        if cacheable:
+            key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+            if (compressed := self.cache.get(key)) is not None:
+                return compressed
+
+        if len(body) >= self.thread_size:
+            compressed = await run_in_threadpool(compress, body, encoding)
+        else:
+            compressed = compress(body, encoding)
+
+        if key is not None:
+            self.cache.put(key, compressed)
+        return compressed
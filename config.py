@@ -1,6 +1,6 @@
+import asyncio
 import os
 from dotenv import load_dotenv
-import motor.motor_asyncio
 
 # Load environment variables
 load_dotenv()
@@ -8,13 +8,114 @@ load_dotenv()
 # Get MongoDB connection string from environment variables
 MONGODB_CONNECTION_STRING = os.getenv("MONGODB_CONNECTION_STRING")
 
-# Create async client
-client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_CONNECTION_STRING)
+DATABASE_NAME = "multimedia_game_assets"
+
+# Connection pool tuning; unset values keep the driver's defaults
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_MAX_IDLE_TIME_MS = os.getenv("MONGODB_MAX_IDLE_TIME_MS")
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS")
+
+# Wire compression, e.g. "zstd,snappy,zlib" (zstd and snappy need extra packages)
+MONGODB_COMPRESSORS = os.getenv("MONGODB_COMPRESSORS", "")
+
+def client_options() -> dict:
+    """Keyword arguments for the Mongo client built from the pool settings"""
+    options = {"maxPoolSize": MONGODB_MAX_POOL_SIZE, "minPoolSize": MONGODB_MIN_POOL_SIZE}
+    if MONGODB_MAX_IDLE_TIME_MS:
+        options["maxIdleTimeMS"] = int(MONGODB_MAX_IDLE_TIME_MS)
+    if MONGODB_WAIT_QUEUE_TIMEOUT_MS:
+        options["waitQueueTimeoutMS"] = int(MONGODB_WAIT_QUEUE_TIMEOUT_MS)
+    if MONGODB_COMPRESSORS:
+        options["compressors"] = MONGODB_COMPRESSORS
+    return options
+
+# Created on first use rather than at import, so cold starts skip importing
+# Motor/pymongo until a request needs the database; warm invocations reuse it
+_client = None
+
+def get_client():
+    """Return the shared async client, creating it on first use"""
+    global _client
+    if _client is None:
+        import motor.motor_asyncio
+        from pool_metrics import create_pool_listener, pool_stats
+        from metrics import create_command_listener
+        _client = motor.motor_asyncio.AsyncIOMotorClient(
+            MONGODB_CONNECTION_STRING,
+            event_listeners=[create_pool_listener(pool_stats), create_command_listener()],
+            **client_options()
+        )
+    return _client
+
+async def warm_pool():
+    """
+    Open connections before the first request arrives, so it does not pay
+    for the TCP/TLS handshake and authentication. Concurrent pings each
+    need their own connection, which fills the pool up to its minimum size.
+    """
+    client = get_client()
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(max(MONGODB_MIN_POOL_SIZE, 1))))
+
+def close_client():
+    """Close the shared client (called from the app lifespan on shutdown)"""
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+class LazyCollection:
+    """
+    Stand-in for a Motor collection that is resolved on first use.
+
+    Attribute access (find, insert_one, ...) is forwarded to the real
+    collection, which is looked up once per client. While a request is
+    being profiled, its operations are recorded with their timings.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._client = None
+        self._collection = None
+
+    def resolve(self):
+        client = get_client()
+        if self._client is not client:
+            self._collection = client[DATABASE_NAME][self.name]
+            self._client = client
+        return self._collection
+
+    def __getattr__(self, attribute: str):
+        # Imported here so loading config does not pull in the profiler
+        from profiling import current_capture, profile_call
+        value = getattr(self.resolve(), attribute)
+        capture = current_capture.get()
+        if capture is not None and callable(value):
+            return profile_call(capture, self.name, attribute, value)
+        return value
+
+    def __repr__(self) -> str:
+        return f"LazyCollection({self.name!r})"
+
+class LazyDatabase:
+    """Stand-in for the Motor database; db.<name> is a LazyCollection"""
+    def __getattr__(self, name: str) -> LazyCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return LazyCollection(name)
 
 # Get database
-db = client.multimedia_game_assets
+db = LazyDatabase()
 
 # Define collections
 sprites_collection = db.sprites
 audio_collection = db.audio
-scores_collection = db.scores
\ No newline at end of file
+scores_collection = db.scores
+
+# Reference counts for content-addressed asset blobs
+blobs_collection = db.blobs
+
+# Materialized per-level / per-window leaderboard rollups
+leaderboard_rollups_collection = db.leaderboard_rollups
+
+# Change counters behind the list endpoints' ETags
+versions_collection = db.collection_versions
@@ -0,0 +1,110 @@
+from starlette.concurrency import run_in_threadpool
+from typing import List, Tuple
+import os
+import time
+
+# How long a worker may go on its own estimate of a cache directory's size
+# before adding a file makes it re-read the directory
+DISK_CACHE_SCAN_SECONDS = float(os.getenv("DISK_CACHE_SCAN_SECONDS", "30"))
+
+class DiskLRU:
+    """
+    Size-bounded set of generated files under one directory.
+
+    Every worker process writes to the same directory, so the budget is
+    enforced on what is actually there rather than on what one worker has
+    written: the directory is scanned and the files with the oldest mtime
+    are deleted until the total fits in max_bytes. A hit touches the file's
+    mtime, so mtime order is least-recently-used order across workers.
+
+    Scans and hits run in a worker thread. Between scans a worker adds its
+    own writes to the last scanned total and rescans as soon as that passes
+    max_bytes, or once the scan is DISK_CACHE_SCAN_SECONDS old, so the
+    directory can only overshoot by what other workers wrote in that window.
+    An entry can have companion files that share its name with another
+    suffix (an atlas PNG and its JSON layout); they count towards its size
+    and are deleted with it.
+    """
+    def __init__(self, root: str, max_bytes: int, suffix: str = ".png", companions: Tuple[str, ...] = (),
+                 scan_interval: float = DISK_CACHE_SCAN_SECONDS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.companions = companions
+        self.scan_interval = scan_interval
+        # Bytes in the directory at the last scan, plus this worker's writes since
+        self.total_bytes = 0
+        self.evicted = 0
+        self._scanned_at = None
+
+    def _paths(self, path: str):
+        stem = path[:-len(self.suffix)]
+        return [path] + [stem + companion for companion in self.companions]
+
+    def entry_size(self, path: str) -> int:
+        """Bytes used on disk by path and its companions"""
+        total = 0
+        for member in self._paths(path):
+            try:
+                total += os.path.getsize(member)
+            except FileNotFoundError:
+                pass
+        return total
+
+    def _scan_existing(self) -> List[Tuple[str, int]]:
+        """(path, size) of every entry in the directory, least recently used first"""
+        found = []
+        if os.path.isdir(self.root):
+            for directory, _, files in os.walk(self.root):
+                for name in files:
+                    if name.endswith(self.suffix):
+                        path = os.path.join(directory, name)
+                        try:
+                            modified = os.stat(path).st_mtime
+                        except FileNotFoundError:
+                            # Evicted by another worker mid-scan
+                            continue
+                        found.append((modified, path, self.entry_size(path)))
+        found.sort()
+        return [(path, size) for _, path, size in found]
+
+    def _enforce_budget(self):
+        entries = self._scan_existing()
+        total = sum(size for _, size in entries)
+        # The newest entry is kept even if it alone is over budget
+        for path, size in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            for member in self._paths(path):
+                try:
+                    os.unlink(member)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            self.evicted += 1
+        self.total_bytes = total
+        self._scanned_at = time.monotonic()
+
+    async def ensure_loaded(self):
+        """Bring the directory within budget on first use (it may hold files from earlier runs)"""
+        if self._scanned_at is None:
+            await run_in_threadpool(self._enforce_budget)
+
+    @staticmethod
+    def _touch(path: str) -> bool:
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    async def hit(self, path: str) -> bool:
+        """Whether path is cached, marking it recently used if so (in a worker thread, like the scans)"""
+        return await run_in_threadpool(self._touch, path)
+
+    async def add(self, path: str, size: int):
+        """Account for a freshly written file, evicting older ones if the directory is over budget"""
+        self.total_bytes += size
+        if (self.total_bytes > self.max_bytes or self._scanned_at is None
+                or time.monotonic() - self._scanned_at >= self.scan_interval):
+            await run_in_threadpool(self._enforce_budget)
@@ -0,0 +1,64 @@
+from fastapi import HTTPException
+from typing import Any, Dict, Iterable, List, Optional
+import re
+
+# Limits on the tag filter so a query string cannot build an unbounded $in/$all
+MAX_FILTER_TAGS = 20
+TAG_PATTERN = re.compile(r'^[a-zA-Z0-9_\-]{1,50}$')
+
+# Most tags returned by a facets request
+DEFAULT_FACET_TAGS = 100
+MAX_FACET_TAGS = 1000
+
+def asset_query(tags: Optional[str], match: str, format: Optional[str], formats: Iterable[str]) -> Dict[str, Any]:
+    """
+    Build the find() filter for the ?tags=a,b&match=all|any&format= list
+    parameters, validating every value before it reaches the query.
+
+    Both fields have multikey/single-field indexes (see indexes.py), so
+    filtered pages are index scans rather than collection scans.
+    """
+    query: Dict[str, Any] = {}
+
+    if tags:
+        tag_list = list(dict.fromkeys(tag.strip() for tag in tags.split(",") if tag.strip()))
+        if len(tag_list) > MAX_FILTER_TAGS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_FILTER_TAGS} tags can be filtered on")
+        if not all(TAG_PATTERN.match(tag) for tag in tag_list):
+            raise HTTPException(status_code=400, detail="Tags can only contain alphanumeric characters, underscores and hyphens")
+        if match not in ("all", "any"):
+            raise HTTPException(status_code=400, detail="Match must be 'all' or 'any'")
+        if len(tag_list) == 1:
+            query["tags"] = tag_list[0]
+        elif tag_list:
+            query["tags"] = {"$all" if match == "all" else "$in": tag_list}
+
+    if format is not None:
+        if format not in formats:
+            raise HTTPException(status_code=400, detail=f"Format must be one of {', '.join(formats)}")
+        query["format"] = format
+
+    return query
+
+async def facet_counts(collection, query: Dict[str, Any], tag_limit: int = DEFAULT_FACET_TAGS) -> Dict[str, Any]:
+    """
+    Count matching documents per tag and per format in one round trip.
+
+    The $match runs first so it can use the indexes; only the two faceted
+    fields are carried into the $facet stage.
+    """
+    pipeline: List[Dict[str, Any]] = [
+        {"$match": query},
+        {"$project": {"_id": 0, "tags": 1, "format": 1}},
+        {"$facet": {
+            "tags": [{"$unwind": "$tags"}, {"$sortByCount": "$tags"}, {"$limit": tag_limit}],
+            "formats": [{"$sortByCount": "$format"}],
+            "total": [{"$count": "count"}]
+        }}
+    ]
+    result = (await collection.aggregate(pipeline).to_list(1))[0]
+    return {
+        "total": result["total"][0]["count"] if result["total"] else 0,
+        "tags": [{"tag": bucket["_id"], "count": bucket["count"]} for bucket in result["tags"]],
+        "formats": [{"format": bucket["_id"], "count": bucket["count"]} for bucket in result["formats"]]
+    }
@@ -0,0 +1,18 @@
+from config import sprites_collection, audio_collection, scores_collection, leaderboard_rollups_collection
+
+async def ensure_indexes():
+    """
+    Create the indexes the API's queries rely on.
+
+    create_index is a no-op when an identical index already exists, so this
+    is safe to run on every startup.
+    """
+    # Tag and format filters on the asset lists; _id second so filtered pages
+    # still come back in keyset order (tags is an array, so this is multikey)
+    for collection in (sprites_collection, audio_collection):
+        await collection.create_index([("tags", 1), ("_id", 1)])
+        await collection.create_index([("format", 1), ("_id", 1)])
+    # Per-level leaderboards sorted by score, ties broken by age
+    await scores_collection.create_index([("game_level", 1), ("score", -1), ("created_at", 1)])
+    # Lets the expiry task find finished rollup windows without a scan
+    await leaderboard_rollups_collection.create_index("expires_at", sparse=True)
@@ -0,0 +1,227 @@
+from bson import ObjectId
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import math
+import os
+import random
+
+# How often each worker pulls scores inserted by other workers
+LEADERBOARD_SYNC_SECONDS = float(os.getenv("LEADERBOARD_SYNC_SECONDS", "5"))
+
+# Scores are picked up by the sync if inserted up to this long before the
+# newest one already seen (ObjectIds from different workers interleave)
+SYNC_OVERLAP = timedelta(seconds=30)
+
+class _Node:
+    __slots__ = ("key", "value", "next", "width")
+
+    def __init__(self, key, value, levels: int):
+        self.key = key
+        self.value = value
+        self.next: List[Optional["_Node"]] = [None] * levels
+        # width[level] = number of level-0 steps to next[level]
+        self.width: List[int] = [1] * levels
+
+class IndexableSkipList:
+    """
+    Sorted container with O(log n) insert, remove, rank and index lookups.
+
+    A skip list whose links also record how many entries they jump over, so
+    the position of a key (its rank) is the sum of the widths followed on the
+    way down to it, and the i-th entry is found by spending i along the way.
+    """
+    MAX_LEVELS = 24
+
+    def __init__(self):
+        self.size = 0
+        self.head = _Node(None, None, self.MAX_LEVELS)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _random_levels(self) -> int:
+        return min(self.MAX_LEVELS, 1 - int(math.log(1.0 - random.random(), 2.0)))
+
+    def insert(self, key, value):
+        chain = [None] * self.MAX_LEVELS
+        steps_at_level = [0] * self.MAX_LEVELS
+        node = self.head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key < key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        levels = self._random_levels()
+        new_node = _Node(key, value, levels)
+        steps = 0
+        for level in range(levels):
+            previous = chain[level]
+            new_node.next[level] = previous.next[level]
+            previous.next[level] = new_node
+            new_node.width[level] = previous.width[level] - steps
+            previous.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(levels, self.MAX_LEVELS):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key):
+        chain = [None] * self.MAX_LEVELS
+        node = self.head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        for level in range(len(target.next)):
+            previous = chain[level]
+            previous.width[level] += target.width[level] - 1
+            previous.next[level] = target.next[level]
+        for level in range(len(target.next), self.MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def rank(self, key) -> int:
+        """0-based position of key"""
+        node = self.head
+        position = 0
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key <= key:
+                position += node.width[level]
+                node = node.next[level]
+        if node is self.head or node.key != key:
+            raise KeyError(key)
+        return position - 1
+
+    def _node_at(self, index: int) -> _Node:
+        node = self.head
+        remaining = index + 1
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        return node
+
+    def slice(self, start: int, stop: int) -> List[Tuple[Any, Any]]:
+        """Entries with positions in [start, stop), in order"""
+        start = max(start, 0)
+        stop = min(stop, self.size)
+        if start >= stop:
+            return []
+        node = self._node_at(start)
+        entries = []
+        for _ in range(stop - start):
+            entries.append((node.key, node.value))
+            node = node.next[0]
+        return entries
+
+class Leaderboard:
+    """
+    In-memory ranking of every score document, highest score first.
+
+    Entries are keyed by (-score, _id), so equal scores rank by who set them
+    first. Each player's best entry is tracked so rank and "around me"
+    queries are O(log n) lookups rather than collection scans.
+
+    Every worker keeps its own copy: it is loaded from scores_collection on
+    startup, updated directly by add_score, and a background sync picks up
+    scores other workers have inserted since.
+    """
+    def __init__(self):
+        self.entries = IndexableSkipList()
+        self.best: Dict[str, Tuple[int, ObjectId]] = {}
+        self.known_ids = set()
+        self.newest_id: Optional[ObjectId] = None
+        self.loaded = False
+        self.version = 0
+        # Other workers' versions count different histories, so ETags carry this too
+        self.instance = os.urandom(4).hex()
+        self._load_lock = asyncio.Lock()
+
+    def add(self, score: Dict[str, Any]):
+        """Record a score document (with its ObjectId _id); duplicates are ignored"""
+        score_id = score["_id"]
+        if score_id in self.known_ids:
+            return
+        self.known_ids.add(score_id)
+        if self.newest_id is None or score_id > self.newest_id:
+            self.newest_id = score_id
+
+        key = (-score["score"], score_id)
+        entry = {**score, "_id": str(score_id)}
+        self.entries.insert(key, entry)
+
+        player = score["player_name"]
+        best = self.best.get(player)
+        if best is None or key < best:
+            self.best[player] = key
+        self.version += 1
+
+    async def load(self, collection):
+        """Build the ranking from every score in the collection"""
+        async for score in collection.find():
+            self.add(score)
+        self.loaded = True
+
+    async def ensure_loaded(self, collection):
+        if self.loaded:
+            return
+        async with self._load_lock:
+            if not self.loaded:
+                await self.load(collection)
+
+    async def sync(self, collection):
+        """Pull in scores inserted (by any worker) since the newest one seen"""
+        query = {}
+        if self.newest_id is not None:
+            since = self.newest_id.generation_time - SYNC_OVERLAP
+            query = {"_id": {"$gt": ObjectId.from_datetime(since)}}
+        async for score in collection.find(query):
+            self.add(score)
+
+    async def run_sync(self, collection, interval: float = LEADERBOARD_SYNC_SECONDS):
+        """Background task that loads the ranking, then keeps it in sync"""
+        while True:
+            try:
+                if self.loaded:
+                    await self.sync(collection)
+                else:
+                    await self.ensure_loaded(collection)
+            except Exception as e:
+                print(f"Leaderboard sync failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+    def etag(self) -> str:
+        """Weak ETag for the current ranking"""
+        return f'W/"leaderboard-{self.instance}-{self.version}"'
+
+    def top(self, limit: int) -> List[Dict[str, Any]]:
+        return [entry for _, entry in self.entries.slice(0, limit)]
+
+    def rank(self, player_name: str) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """1-based rank of a player's best score, with that score's entry"""
+        key = self.best.get(player_name)
+        if key is None:
+            return None
+        position = self.entries.rank(key)
+        return position + 1, self.entries.slice(position, position + 1)[0][1]
+
+    def around(self, player_name: str, radius: int) -> Optional[List[Dict[str, Any]]]:
+        """Entries within radius places of a player's best score, with their ranks"""
+        key = self.best.get(player_name)
+        if key is None:
+            return None
+        position = self.entries.rank(key)
+        start = max(position - radius, 0)
+        return [
+            {"rank": start + offset + 1, **entry}
+            for offset, (_, entry) in enumerate(self.entries.slice(start, position + radius + 1))
+        ]
+
+# Shared leaderboard instance
+leaderboard = Leaderboard()
@@ -1,20 +1,81 @@
 from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from contextlib import asynccontextmanager
+import asyncio
 import os
-import re
+import time
 from routes import router
-from config import client
-from security import RateLimiter, log_injection_attempt
+from config import get_client, close_client, warm_pool, client_options, scores_collection
+from storage import blob_store
+from workers import SingleFlight, shutdown_process_pool
+from leaderboard import leaderboard
+from rollups import run_rollup_maintenance
+from indexes import ensure_indexes
+from routes.scores import score_writer
+from cache import cache_stats
+from search import search_index
+from routes.search import search_collections
+from versions import collection_versions
+from compression import CompressionMiddleware
+from pool_metrics import pool_stats
+from metrics import PROMETHEUS_MEDIA_TYPE, record_rate_limited, record_request, render_metrics, route_template
+from profiling import request_profiler
+from security import (
+    RateLimiter, SharedRateLimitStore, RequestBodyTooLarge, log_injection_attempt,
+    scan_request_target, is_json_request, read_json_body, scan_request_body, has_valid_api_key,
+    body_limit
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        await warm_pool()
+    except Exception as e:
+        print(f"Failed to warm the connection pool: {str(e)}")
+
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        print(f"Failed to create indexes: {str(e)}")
+    
+    # Start background maintenance tasks
+    background_tasks = [
+        asyncio.create_task(blob_store.run_collector()),
+        asyncio.create_task(leaderboard.run_sync(scores_collection)),
+        asyncio.create_task(run_rollup_maintenance()),
+        asyncio.create_task(search_index.run_refresh(search_collections())),
+        asyncio.create_task(collection_versions.run_poller()),
+    ]
+    yield
+    for task in background_tasks:
+        task.cancel()
+    if score_writer is not None:
+        await score_writer.close()
+    shutdown_process_pool()
+    close_client()
 
 app = FastAPI(
     title="Multimedia Game Assets API",
     description="A RESTful API for managing game assets including sprites, audio files, and player scores",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Initialize rate limiter
-rate_limiter = RateLimiter(requests_per_minute=100)
+# RATE_LIMIT_BACKEND=mmap shares one budget between all workers on the host
+if os.getenv("RATE_LIMIT_BACKEND", "memory") == "mmap":
+    rate_limit_store = SharedRateLimitStore(
+        os.getenv("RATE_LIMIT_SHM_PATH", "/dev/shm/game_assets_rate_limit"),
+        buckets=int(os.getenv("RATE_LIMIT_SHM_BUCKETS", "8192"))
+    )
+else:
+    rate_limit_store = None
+rate_limiter = RateLimiter(requests_per_minute=100, store=rate_limit_store)
+
+# Compress JSON responses (added first, so it runs innermost and sees
+# complete bodies rather than the security middleware's re-streamed ones)
+app.add_middleware(CompressionMiddleware)
 
 # Add CORS middleware
 app.add_middleware(
@@ -23,41 +84,60 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Content-Range", "Accept-Ranges"],
 )
 
-# Middleware for rate limiting and input sanitization
+# Middleware for rate limiting, input sanitization, request metrics and profiling
 @app.middleware("http")
 async def security_middleware(request: Request, call_next):
+    started = time.perf_counter()
+    capture = request_profiler.start(request, has_valid_api_key)
+    status_code = 500
+    try:
+        response = await screen_request(request, call_next)
+        status_code = response.status_code
+        return response
+    finally:
+        # Also runs on errors and cancellation, so cProfile and the sampler
+        # are never left running for a request that is gone. The router
+        # records the matched endpoint in the shared scope.
+        elapsed = time.perf_counter() - started
+        route = route_template(request.scope, app.routes)
+        record_request(request.method, route, status_code, elapsed)
+        request_profiler.finish(capture, request, route, status_code, elapsed)
+
+async def screen_request(request: Request, call_next):
     # Get client IP
     client_ip = request.client.host
     
     # Check rate limit
     if not await rate_limiter.check_rate_limit(client_ip):
+        record_rate_limited()
         return JSONResponse(
             status_code=429,
             content={"detail": "Rate limit exceeded. Please try again later."}
         )
     
-    # Check for potential NoSQL injection patterns in the URL
-    url_path = str(request.url)
-    
-    # Simple pattern matching for NoSQL injection attempts
-    suspicious_patterns = [
-        r'\$where',
-        r'\$ne',
-        r'\$gt',
-        r'\$lt',
-        r'\$regex',
-        r'\$exists',
-        r'\.\.\/',
-        r'\/\.\.', 
-        r';'
-    ]
+    # Check the path and query string for NoSQL injection patterns in one pass
+    if scan_request_target(request.url.path, request.url.query):
+        # Log injection attempt
+        log_injection_attempt(str(request.url))
+        return JSONResponse(
+            status_code=400,
+            content={"detail": "Potential security threat detected in request"}
+        )
     
-    for pattern in suspicious_patterns:
-        if re.search(pattern, url_path, re.IGNORECASE):
-            # Log injection attempt
-            log_injection_attempt(url_path)
+    # Scan JSON bodies too (size-capped, replayed to the handler afterwards)
+    if is_json_request(request):
+        try:
+            body = await read_json_body(request, body_limit(request.url.path))
+        except RequestBodyTooLarge:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": "Request body too large"}
+            )
+        if scan_request_body(body):
+            log_injection_attempt(str(request.url), body.decode(errors="replace"))
             return JSONResponse(
                 status_code=400,
                 content={"detail": "Potential security threat detected in request"}
@@ -83,15 +163,53 @@ async def root():
         }
     }
 
+# Probes can arrive several times a second from every load balancer, so the
+# ping result is reused for a few seconds and concurrent probes share one ping
+HEALTH_CACHE_SECONDS = float(os.getenv("HEALTH_CACHE_SECONDS", "5"))
+health_pings = SingleFlight()
+last_health_check = None
+
+async def ping_database():
+    """Return (checked_at, error) for the latest ping, pinging again once stale"""
+    global last_health_check
+    if last_health_check is not None and time.monotonic() - last_health_check[0] < HEALTH_CACHE_SECONDS:
+        return last_health_check
+
+    async def ping():
+        global last_health_check
+        try:
+            await get_client().admin.command('ping')
+            last_health_check = (time.monotonic(), None)
+        except Exception as e:
+            last_health_check = (time.monotonic(), str(e))
+        return last_health_check
+
+    return await health_pings.run("ping", ping)
+
 # Health check endpoint
 @app.get("/health", tags=["Health"])
 async def health_check():
-    try:
-        # Check if MongoDB is connected
-        await client.admin.command('ping')
-        return {"status": "healthy", "database": "connected"}
-    except Exception as e:
-        raise HTTPException(status_code=503, detail=f"Database connection failed: {str(e)}")
+    # Check if MongoDB is connected (cached for HEALTH_CACHE_SECONDS)
+    checked_at, error = await ping_database()
+    if error is not None:
+        raise HTTPException(status_code=503, detail=f"Database connection failed: {error}")
+    return {"status": "healthy", "database": "connected",
+            "checked_seconds_ago": round(time.monotonic() - checked_at, 3)}
+
+@app.get("/health/cache", tags=["Health"])
+async def cache_health():
+    # Hit/miss counters of this worker's by-ID document caches
+    return cache_stats()
+
+@app.get("/health/pool", tags=["Health"])
+async def pool_health():
+    # Checkout waits and connection churn of this worker's Mongo connection pool
+    return {"settings": client_options(), **pool_stats.snapshot()}
+
+@app.get("/metrics", tags=["Health"])
+async def metrics():
+    # Request latencies, rate-limit rejections and Mongo command timings (Prometheus format)
+    return Response(render_metrics(), media_type=PROMETHEUS_MEDIA_TYPE)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,434 @@
+from typing import BinaryIO, Dict, NamedTuple, Tuple
+import os
+import struct
+
+class MediaFormatError(ValueError):
+    """Raised when a file's content does not match its extension or cannot be parsed"""
+    pass
+
+# Leading signatures of the supported image formats
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+GIF_SIGNATURES = (b"GIF87a", b"GIF89a")
+JPEG_SIGNATURE = b"\xff\xd8\xff"
+
+IMAGE_FORMATS = {"png": "png", "jpg": "jpeg", "jpeg": "jpeg", "gif": "gif"}
+
+# Largest image (width x height) accepted; a small compressed file can
+# declare a size that would take gigabytes to decode for variants and atlases
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(8192 * 8192)))
+
+# JPEG start-of-frame markers carrying the image size (SOF0-SOF15, minus
+# DHT, JPG and DAC which share the range)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# Markers that stand alone without a length field
+JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+
+def detect_image_format(header: bytes) -> str:
+    if header.startswith(PNG_SIGNATURE):
+        return "png"
+    if header[:6] in GIF_SIGNATURES:
+        return "gif"
+    if header.startswith(JPEG_SIGNATURE):
+        return "jpeg"
+    raise MediaFormatError("Unrecognised image format")
+
+def _jpeg_dimensions(f: BinaryIO) -> Tuple[int, int]:
+    """Walk JPEG segment headers, seeking over their payloads, until a SOFn marker"""
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        if not byte:
+            break
+        if byte != b"\xff":
+            raise MediaFormatError("Corrupt JPEG marker stream")
+        # Markers may be preceded by any number of 0xFF fill bytes
+        marker = f.read(1)
+        while marker == b"\xff":
+            marker = f.read(1)
+        if not marker:
+            break
+        code = marker[0]
+        if code in JPEG_STANDALONE_MARKERS:
+            continue
+        if code in (0xD9, 0xDA):
+            # End of image / start of scan without a frame header
+            break
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            break
+        (length,) = struct.unpack(">H", length_bytes)
+        if code in JPEG_SOF_MARKERS:
+            frame = f.read(5)
+            if len(frame) < 5:
+                break
+            _, height, width = struct.unpack(">BHH", frame)
+            return width, height
+        f.seek(length - 2, 1)
+    raise MediaFormatError("JPEG has no frame header")
+
+def probe_image_dimensions(path: str, extension: str) -> Tuple[int, int]:
+    """
+    Reads an image's width and height from its header without decoding pixels.
+
+    PNG and GIF sizes sit at fixed offsets in the first 24 bytes (IHDR and the
+    logical screen descriptor); for JPEG the segment chain is walked with seeks
+    to the first SOFn marker, so only segment headers are read.
+
+    Raises MediaFormatError if the content does not match the extension or
+    the image has more than MAX_IMAGE_PIXELS pixels.
+    """
+    expected = IMAGE_FORMATS.get(extension.lower())
+    with open(path, "rb") as f:
+        header = f.read(24)
+        actual = detect_image_format(header)
+        if actual != expected:
+            raise MediaFormatError(f"File content is {actual}, not {extension}")
+
+        if actual == "png":
+            if header[12:16] != b"IHDR" or len(header) < 24:
+                raise MediaFormatError("PNG is missing its IHDR chunk")
+            width, height = struct.unpack(">II", header[16:24])
+        elif actual == "gif":
+            width, height = struct.unpack("<HH", header[6:10])
+        else:
+            width, height = _jpeg_dimensions(f)
+
+    if width <= 0 or height <= 0:
+        raise MediaFormatError("Image has zero width or height")
+    if width * height > MAX_IMAGE_PIXELS:
+        raise MediaFormatError(f"Image is {width}x{height}, over the limit of {MAX_IMAGE_PIXELS} pixels")
+    return width, height
+
+# ---------------------------------------------------------------------------
+# Audio duration probing
+# ---------------------------------------------------------------------------
+
+# An Ogg page is at most 27 header bytes + 255 lacing values + 255 * 255 bytes
+OGG_MAX_PAGE_SIZE = 65307
+OGG_PAGE_HEADER = struct.Struct("<4sBBqIIIB")
+
+# MPEG audio header lookup tables, indexed by the header's bit fields
+MP3_BITRATES = {
+    # (version is MPEG-1, layer) -> kbps by bitrate index
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+# Bytes read from the first frame on: enough for its header, side information
+# and a Xing/Info or VBRI summary
+MP3_SUMMARY_WINDOW = 64
+
+class WavLayout(NamedTuple):
+    audio_format: int
+    channels: int
+    sample_rate: int
+    byte_rate: int
+    block_align: int
+    bits_per_sample: int
+    data_offset: int
+    data_size: int
+
+# WAVE_FORMAT_EXTENSIBLE stores the real format tag in its sub-format GUID
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+def _wav_layout(f: BinaryIO, file_size: int) -> WavLayout:
+    """Walk the RIFF chunk headers to the fmt and data chunks"""
+    riff = f.read(12)
+    if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+        raise MediaFormatError("File content is not a RIFF/WAVE file")
+
+    fmt = None
+    while True:
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8:
+            break
+        chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+        if chunk_id == b"fmt ":
+            fmt_bytes = f.read(min(chunk_size, 40))
+            if len(fmt_bytes) < 16:
+                break
+            fmt = list(struct.unpack_from("<HHIIHH", fmt_bytes))
+            if fmt[0] == WAVE_FORMAT_EXTENSIBLE and len(fmt_bytes) >= 26:
+                fmt[0] = struct.unpack_from("<H", fmt_bytes, 24)[0]
+            f.seek(chunk_size - len(fmt_bytes) + (chunk_size & 1), 1)
+        elif chunk_id == b"data":
+            if fmt is None or not fmt[3]:
+                raise MediaFormatError("WAV data chunk precedes its fmt chunk")
+            # Streamed WAVs may leave the size as a placeholder; trust the file instead
+            data_offset = f.tell()
+            data_size = min(chunk_size, file_size - data_offset)
+            return WavLayout(*fmt, data_offset, data_size)
+        else:
+            # Chunks are word aligned
+            f.seek(chunk_size + (chunk_size & 1), 1)
+    raise MediaFormatError("WAV has no fmt/data chunks")
+
+def _wav_duration(f: BinaryIO, file_size: int) -> float:
+    """Duration from the RIFF fmt chunk's byte rate and the data chunk's size"""
+    layout = _wav_layout(f, file_size)
+    return layout.data_size / layout.byte_rate
+
+def _ogg_page(buffer: bytes, offset: int):
+    if offset + OGG_PAGE_HEADER.size > len(buffer):
+        return None
+    capture, version, _, granule, serial, _, _, segments = OGG_PAGE_HEADER.unpack_from(buffer, offset)
+    if capture != b"OggS" or version != 0:
+        return None
+    return granule, serial, offset + OGG_PAGE_HEADER.size + segments
+
+def _ogg_duration(f: BinaryIO, file_size: int) -> float:
+    """Duration from the granule position of the last page of the first logical stream"""
+    head = f.read(OGG_PAGE_HEADER.size + 255 + 64)
+    first = _ogg_page(head, 0)
+    if first is None:
+        raise MediaFormatError("File content is not an Ogg stream")
+    _, serial, packet_offset = first
+    packet = head[packet_offset:]
+
+    pre_skip = 0
+    if packet.startswith(b"\x01vorbis") and len(packet) >= 16:
+        sample_rate = struct.unpack_from("<I", packet, 12)[0]
+    elif packet.startswith(b"OpusHead") and len(packet) >= 12:
+        # Opus granule positions always count 48 kHz samples
+        pre_skip = struct.unpack_from("<H", packet, 10)[0]
+        sample_rate = 48000
+    else:
+        raise MediaFormatError("Unsupported Ogg codec")
+    if not sample_rate:
+        raise MediaFormatError("Ogg stream has no sample rate")
+
+    # The last page starts within the final OGG_MAX_PAGE_SIZE bytes
+    tail_size = min(file_size, OGG_MAX_PAGE_SIZE)
+    f.seek(file_size - tail_size)
+    tail = f.read(tail_size)
+    position = len(tail)
+    while (position := tail.rfind(b"OggS", 0, position)) != -1:
+        page = _ogg_page(tail, position)
+        if page is not None and page[1] == serial and page[0] >= 0:
+            return max(page[0] - pre_skip, 0) / sample_rate
+    raise MediaFormatError("Ogg stream has no final granule position")
+
+def _mp3_frame_header(header: bytes):
+    """Decode a 4-byte MPEG audio frame header, or return None if it is not one"""
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version_bits = (header[1] >> 3) & 0x03
+    layer_bits = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    mpeg1 = version_bits == 3
+    layer = 4 - layer_bits
+    bitrate = MP3_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version_bits][sample_rate_index]
+    padding = (header[2] >> 1) & 0x01
+    mono = (header[3] >> 6) == 3
+
+    if layer == 1:
+        samples_per_frame = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples_per_frame = 1152 if (mpeg1 or layer == 2) else 576
+        frame_length = (samples_per_frame // 8) * bitrate // sample_rate + padding
+
+    if mpeg1:
+        side_info = 17 if mono else 32
+    else:
+        side_info = 9 if mono else 17
+    return {
+        "sample_rate": sample_rate,
+        "samples_per_frame": samples_per_frame,
+        "frame_length": frame_length,
+        "side_info": side_info,
+    }
+
+def _mp3_duration(f: BinaryIO, file_size: int) -> float:
+    """Duration from a Xing/Info or VBRI header, falling back to walking frame headers"""
+    start = 0
+    id3 = f.read(10)
+    if id3[:3] == b"ID3" and len(id3) == 10:
+        # Skip the ID3v2 tag (syncsafe size, plus a footer if flagged)
+        size = (id3[6] << 21) | (id3[7] << 14) | (id3[8] << 7) | id3[9]
+        start = 10 + size + (10 if id3[5] & 0x10 else 0)
+
+    # Find the first frame sync within a small window past the tag
+    f.seek(start)
+    window = f.read(4096)
+    first = None
+    for offset in range(len(window) - 3):
+        if window[offset] == 0xFF and (first := _mp3_frame_header(window[offset:offset + 4])):
+            start += offset
+            break
+    if first is None:
+        raise MediaFormatError("File content is not an MPEG audio stream")
+
+    # Re-read from the frame itself, so a sync found near the end of the
+    # first window still has its summary header in view
+    f.seek(start)
+    window = f.read(MP3_SUMMARY_WINDOW)
+
+    # Xing/Info (LAME) header sits right after the side information
+    xing_offset = 4 + first["side_info"]
+    if window[xing_offset:xing_offset + 4] in (b"Xing", b"Info"):
+        if len(window) < xing_offset + 12:
+            raise MediaFormatError("MP3 Xing header is truncated")
+        flags = struct.unpack_from(">I", window, xing_offset + 4)[0]
+        if flags & 0x01:
+            frames = struct.unpack_from(">I", window, xing_offset + 8)[0]
+            return frames * first["samples_per_frame"] / first["sample_rate"]
+
+    # Fraunhofer VBRI header sits at a fixed 32 bytes past the frame header
+    if window[36:40] == b"VBRI":
+        if len(window) < 36 + 18:
+            raise MediaFormatError("MP3 VBRI header is truncated")
+        frames = struct.unpack_from(">I", window, 36 + 14)[0]
+        return frames * first["samples_per_frame"] / first["sample_rate"]
+
+    # No summary header: walk frame headers, seeking over each frame's payload
+    frames = 0
+    position = start
+    while position + 4 <= file_size:
+        f.seek(position)
+        frame = _mp3_frame_header(f.read(4))
+        if frame is None or frame["frame_length"] <= 0:
+            break
+        frames += 1
+        position += frame["frame_length"]
+    return frames * first["samples_per_frame"] / first["sample_rate"]
+
+AUDIO_PROBES = {"wav": _wav_duration, "ogg": _ogg_duration, "mp3": _mp3_duration}
+
+def probe_audio_duration(path: str, extension: str) -> float:
+    """
+    Computes an audio file's duration in seconds from container metadata.
+
+    Only the byte ranges that carry the answer are read: the RIFF fmt/data
+    chunk headers for WAV, the first and last pages for Ogg, and the
+    Xing/VBRI header (or just the frame headers) for MP3. This is blocking
+    file I/O, so callers on the event loop should run it in a thread.
+
+    Raises MediaFormatError if the content does not match the extension.
+    """
+    probe = AUDIO_PROBES.get(extension.lower())
+    if probe is None:
+        raise MediaFormatError(f"Unsupported audio format: {extension}")
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        file_size = f.tell()
+        f.seek(0)
+        return probe(f, file_size)
+
+# ---------------------------------------------------------------------------
+# Waveform peaks
+# ---------------------------------------------------------------------------
+
+# Frames converted to float per vectorised step; bounds peak memory use
+PEAK_BLOCK_FRAMES = 1 << 20
+
+def _pcm_reader(layout: WavLayout):
+    """
+    Return (numpy dtype, decoder, full scale) for a WAV sample format.
+
+    The decoder turns a block of raw samples into a signed numeric array;
+    dividing by the full scale maps it to [-1, 1].
+    """
+    import numpy as np
+
+    bits = layout.bits_per_sample
+    if layout.audio_format == WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+        return np.dtype("<f4" if bits == 32 else "<f8"), lambda block: block, 1.0
+    if layout.audio_format != WAVE_FORMAT_PCM:
+        raise MediaFormatError("Only PCM and IEEE float WAV files are supported")
+    if bits == 8:
+        # 8-bit PCM is unsigned, centred on 128
+        return np.dtype("u1"), lambda block: block.astype(np.int16) - 128, 128.0
+    if bits == 16:
+        return np.dtype("<i2"), lambda block: block, 32768.0
+    if bits == 32:
+        return np.dtype("<i4"), lambda block: block, 2147483648.0
+    if bits == 24:
+        # Packed 3-byte samples: widen to int32 and sign-extend with shifts
+        def decode(block):
+            block = block.reshape(-1, 3)
+            wide = (block[:, 0].astype(np.int32)
+                    | (block[:, 1].astype(np.int32) << 8)
+                    | (block[:, 2].astype(np.int32) << 16))
+            return (wide << 8) >> 8
+        return np.dtype("u1"), decode, 8388608.0
+    raise MediaFormatError(f"Unsupported WAV sample size: {bits} bits")
+
+def compute_wav_peaks(path: str, buckets: int) -> Dict:
+    """
+    Computes a min/max/RMS envelope of a WAV file in `buckets` equal slices.
+
+    The sample data is memory-mapped rather than read, and reduced with
+    NumPy (np.minimum/maximum/add.reduceat over bucket edges) on the
+    interleaved samples, a block of PEAK_BLOCK_FRAMES frames at a time so
+    memory stays bounded for long files. Channels are combined: min/max and
+    RMS are taken over every channel's samples. Blocking; run it in a thread.
+    """
+    import numpy as np
+
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        file_size = f.tell()
+        f.seek(0)
+        layout = _wav_layout(f, file_size)
+
+    dtype, decode, scale = _pcm_reader(layout)
+    channels = max(layout.channels, 1)
+    frames = layout.data_size // layout.block_align if layout.block_align else 0
+    result = {
+        "sample_rate": layout.sample_rate,
+        "channels": channels,
+        "duration": layout.data_size / layout.byte_rate,
+        "buckets": 0,
+        "min": [],
+        "max": [],
+        "rms": [],
+    }
+    if frames == 0:
+        return result
+
+    buckets = min(buckets, frames)
+    # One row per frame; packed 24-bit samples are 3 bytes each
+    width = channels * 3 if layout.bits_per_sample == 24 else channels
+    samples = np.memmap(path, dtype=dtype, mode="r", offset=layout.data_offset, shape=(frames, width))
+
+    edges = np.linspace(0, frames, buckets + 1).astype(np.int64)
+    minimum = np.empty(buckets, dtype=np.float64)
+    maximum = np.empty(buckets, dtype=np.float64)
+    squares = np.empty(buckets, dtype=np.float64)
+
+    first = 0
+    while first < buckets:
+        # Take as many whole buckets as fit in one block (at least one)
+        last = int(np.searchsorted(edges, edges[first] + PEAK_BLOCK_FRAMES, side="right")) - 1
+        last = min(max(last, first + 1), buckets)
+        start, end = edges[first], edges[last]
+
+        block = decode(np.asarray(samples[start:end]).reshape(-1))
+        offsets = (edges[first:last] - start) * channels
+        minimum[first:last] = np.minimum.reduceat(block, offsets)
+        maximum[first:last] = np.maximum.reduceat(block, offsets)
+        squares[first:last] = np.add.reduceat(np.square(block, dtype=np.float64), offsets)
+        first = last
+
+    del samples
+    counts = np.diff(edges) * channels
+    result.update({
+        "buckets": buckets,
+        "min": np.round(minimum / scale, 4).tolist(),
+        "max": np.round(maximum / scale, 4).tolist(),
+        "rms": np.round(np.sqrt(squares / counts) / scale, 4).tolist(),
+    })
+    return result
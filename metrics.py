@@ -0,0 +1,215 @@
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+import threading
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Starlette appends "; charset=utf-8" to text types
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4"
+
+class Histogram:
+    """Bucket counts plus sum and count, in the Prometheus histogram layout, and the largest value"""
+    __slots__ = ("buckets", "sum", "count", "max")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.buckets[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "Histogram"):
+        for index, count in enumerate(other.buckets):
+            self.buckets[index] += count
+        self.sum += other.sum
+        self.count += other.count
+        if other.max > self.max:
+            self.max = other.max
+
+class ThreadLocalSeries:
+    """
+    Histograms and counters keyed by label tuples, recorded without locks.
+
+    Every thread records into its own dicts (the event loop for requests,
+    Motor's worker threads for commands and pool events), so recording is
+    a dict lookup and a few additions. A scrape sums the threads' series;
+    reading while a thread records may be off by the in-flight observation,
+    which is fine for monitoring. The only lock guards registering a new thread.
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self._threads: List[Tuple[Dict[Hashable, Histogram], Dict[Hashable, int]]] = []
+        self._register_lock = threading.Lock()
+
+    def _series(self) -> Tuple[Dict[Hashable, Histogram], Dict[Hashable, int]]:
+        series = getattr(self._local, "series", None)
+        if series is None:
+            series = ({}, {})
+            with self._register_lock:
+                self._threads.append(series)
+            self._local.series = series
+        return series
+
+    def observe(self, labels: Hashable, seconds: float):
+        histograms = self._series()[0]
+        histogram = histograms.get(labels)
+        if histogram is None:
+            histogram = histograms[labels] = Histogram()
+        histogram.observe(seconds)
+
+    def increment(self, labels: Hashable, amount: int = 1):
+        counters = self._series()[1]
+        counters[labels] = counters.get(labels, 0) + amount
+
+    def collect(self) -> Tuple[Dict[Hashable, Histogram], Dict[Hashable, int]]:
+        with self._register_lock:
+            threads = list(self._threads)
+        histograms: Dict[Hashable, Histogram] = {}
+        counters: Dict[Hashable, int] = {}
+        for thread_histograms, thread_counters in threads:
+            for labels, histogram in list(thread_histograms.items()):
+                histograms.setdefault(labels, Histogram()).merge(histogram)
+            for labels, count in list(thread_counters.items()):
+                counters[labels] = counters.get(labels, 0) + count
+        return histograms, counters
+
+# HTTP requests: histograms by (method, route), counters by (method, route, status)
+request_metrics = ThreadLocalSeries()
+
+# Requests turned away by the rate limiter
+rate_limit_metrics = ThreadLocalSeries()
+
+# Mongo commands: histograms by (collection, command), counters count failures
+command_metrics = ThreadLocalSeries()
+
+_route_templates: Dict[Callable, str] = {}
+
+def route_template(scope: Dict[str, Any], routes: Iterable[Any]) -> str:
+    """
+    The matched route's path template ("/sprites/{id}"), so one label covers
+    every id. The router leaves the endpoint in the scope; unmatched paths
+    share one label to keep the series count bounded.
+    """
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    template = _route_templates.get(endpoint)
+    if template is None:
+        for route in routes:
+            if getattr(route, "endpoint", None) is endpoint:
+                template = route.path_format
+                break
+        else:
+            template = "unmatched"
+        _route_templates[endpoint] = template
+    return template
+
+def record_request(method: str, route: str, status: int, seconds: float):
+    request_metrics.observe((method, route), seconds)
+    request_metrics.increment((method, route, str(status)))
+
+def record_rate_limited():
+    rate_limit_metrics.increment(())
+
+def create_command_listener():
+    """
+    Build a pymongo CommandListener that times commands per collection.
+
+    Started and finished events for a command arrive on the same thread, so
+    each thread remembers the collections of its in-flight requests. Defined
+    in a function so pymongo is only imported when the client is created.
+    """
+    from pymongo import monitoring
+
+    in_flight = threading.local()
+
+    class CommandTimer(monitoring.CommandListener):
+        def started(self, event):
+            pending = getattr(in_flight, "collections", None)
+            if pending is None:
+                pending = in_flight.collections = {}
+            target = event.command.get(event.command_name)
+            if not isinstance(target, str):
+                # getMore/killCursors carry the collection separately
+                target = event.command.get("collection", "")
+            pending[event.request_id] = target if isinstance(target, str) else ""
+
+        def _collection(self, event) -> str:
+            pending = getattr(in_flight, "collections", None)
+            return pending.pop(event.request_id, "") if pending is not None else ""
+
+        def succeeded(self, event):
+            command_metrics.observe((self._collection(event), event.command_name), event.duration_micros / 1e6)
+
+        def failed(self, event):
+            labels = (self._collection(event), event.command_name)
+            command_metrics.observe(labels, event.duration_micros / 1e6)
+            command_metrics.increment(labels)
+
+    return CommandTimer()
+
+def _label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: Optional[str] = None) -> str:
+    pairs = [f'{name}="{_label_value(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _histogram_lines(name: str, label_names: Tuple[str, ...], histograms: Dict[Hashable, Histogram]) -> List[str]:
+    lines = []
+    for labels, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, histogram.buckets):
+            cumulative += count
+            bucket = 'le="%s"' % bound
+            lines.append(f"{name}_bucket{_labels(label_names, labels, bucket)} {cumulative}")
+        bucket = 'le="+Inf"'
+        lines.append(f"{name}_bucket{_labels(label_names, labels, bucket)} {histogram.count}")
+        lines.append(f"{name}_sum{_labels(label_names, labels)} {histogram.sum!r}")
+        lines.append(f"{name}_count{_labels(label_names, labels)} {histogram.count}")
+    return lines
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    request_histograms, request_counts = request_metrics.collect()
+    _, rejections = rate_limit_metrics.collect()
+    command_histograms, command_failures = command_metrics.collect()
+
+    lines = [
+        "# HELP http_requests_total Requests handled, by route template and status.",
+        "# TYPE http_requests_total counter",
+    ]
+    for labels, count in sorted(request_counts.items()):
+        lines.append(f"http_requests_total{_labels(('method', 'route', 'status'), labels)} {count}")
+
+    lines += [
+        "# HELP http_request_duration_seconds Time until the response starts, by route template.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    lines += _histogram_lines("http_request_duration_seconds", ("method", "route"), request_histograms)
+
+    lines += [
+        "# HELP rate_limit_rejections_total Requests rejected by the rate limiter.",
+        "# TYPE rate_limit_rejections_total counter",
+        f"rate_limit_rejections_total {rejections.get((), 0)}",
+        "# HELP mongodb_command_duration_seconds MongoDB command round trips, by collection and command.",
+        "# TYPE mongodb_command_duration_seconds histogram",
+    ]
+    lines += _histogram_lines("mongodb_command_duration_seconds", ("collection", "command"), command_histograms)
+
+    lines += [
+        "# HELP mongodb_command_failures_total MongoDB commands that returned an error.",
+        "# TYPE mongodb_command_failures_total counter",
+    ]
+    for labels, count in sorted(command_failures.items()):
+        lines.append(f"mongodb_command_failures_total{_labels(('collection', 'command'), labels)} {count}")
+    return "\n".join(lines) + "\n"
@@ -36,6 +36,9 @@ class SpriteModel(MongoBaseModel):
     format: str = Field(..., regex="^(png|jpg|jpeg|gif)$")
     tags: List[str] = []
     description: Optional[str] = None
+    size: Optional[int] = Field(None, ge=0)  # Stored size in bytes
+    sha256: Optional[str] = None  # Hex digest of the stored bytes
+    blob_key: Optional[str] = None  # Location in the blob store
 
 class AudioModel(MongoBaseModel):
     name: str = Field(..., min_length=1, max_length=100, regex="^[a-zA-Z0-9_\\-\\.]+$")
@@ -44,6 +47,9 @@ class AudioModel(MongoBaseModel):
     format: str = Field(..., regex="^(mp3|wav|ogg)$")
     tags: List[str] = []
     description: Optional[str] = None
+    size: Optional[int] = Field(None, ge=0)  # Stored size in bytes
+    sha256: Optional[str] = None  # Hex digest of the stored bytes
+    blob_key: Optional[str] = None  # Location in the blob store
 
 class PlayerScoreModel(MongoBaseModel):
     player_name: str = Field(..., min_length=1, max_length=100, regex="^[a-zA-Z0-9_]+$")
@@ -55,4 +61,10 @@ class ScoreInput(BaseModel):
     player_name: str = Field(..., min_length=1, max_length=100)
     score: int = Field(..., ge=0)
     game_level: Optional[int] = Field(None, ge=1)
-    time_played: Optional[float] = Field(None, ge=0.0)
\ No newline at end of file
+    time_played: Optional[float] = Field(None, ge=0.0)
+
+class AtlasRequest(BaseModel):
+    sprite_ids: List[str] = Field(..., min_items=1, max_items=256)
+    padding: int = Field(0, ge=0, le=16)  # Transparent border around each sprite
+    power_of_two: bool = False  # Round atlas dimensions up to powers of two
+    max_size: int = Field(4096, ge=16, le=8192)  # Largest allowed atlas edge
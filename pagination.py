@@ -0,0 +1,80 @@
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from responses import MongoJSONResponse, dumps_mongo
+import base64
+import json
+
+# Page size limits for the list endpoints
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 1000
+
+# Number of documents Motor pulls from the server per round trip
+CURSOR_BATCH_SIZE = 100
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(last_id: ObjectId) -> str:
+    """Encode the last seen _id as an opaque continuation token"""
+    payload = json.dumps({"after": str(last_id)}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(token: str) -> ObjectId:
+    """Decode a continuation token back into the _id to resume after"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return ObjectId(payload["after"])
+    except (ValueError, TypeError, KeyError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+def wants_ndjson(request: Request) -> bool:
+    """Check whether the client asked for a newline-delimited JSON stream"""
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+async def paginate(collection, request: Request, cursor: Optional[str] = None,
+                   limit: Optional[int] = None, query: Optional[Dict[str, Any]] = None):
+    """
+    Runs a keyset-paginated find() against a collection.
+
+    Documents are ordered by _id (ObjectIds embed their creation time, so this
+    is also insertion order) and each page resumes with {"_id": {"$gt": last}}
+    instead of skipping, so every page costs the same no matter how deep it is.
+
+    - JSON mode returns one page and puts the continuation token for the next
+      page in the X-Next-Cursor header (absent on the last page)
+    - NDJSON mode (Accept: application/x-ndjson) streams documents straight
+      out of the Motor cursor, one per line, without buffering the result set
+    """
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400,
+                            detail=f"Limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    filter_query = dict(query or {})
+    if cursor:
+        filter_query["_id"] = {"$gt": decode_cursor(cursor)}
+
+    if wants_ndjson(request):
+        db_cursor = collection.find(filter_query).sort("_id", 1).batch_size(CURSOR_BATCH_SIZE)
+        if limit is not None:
+            db_cursor = db_cursor.limit(limit)
+
+        async def stream_documents():
+            async for document in db_cursor:
+                yield dumps_mongo(document) + b"\n"
+
+        return StreamingResponse(stream_documents(), media_type=NDJSON_MEDIA_TYPE)
+
+    page_size = limit or DEFAULT_PAGE_SIZE
+    # Fetch one extra document to find out whether another page exists
+    documents = await collection.find(filter_query).sort("_id", 1).limit(page_size + 1).to_list(page_size + 1)
+
+    headers = {}
+    if len(documents) > page_size:
+        documents = documents[:page_size]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(documents[-1]["_id"])
+
+    return MongoJSONResponse(content=documents, headers=headers)
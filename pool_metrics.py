@@ -0,0 +1,110 @@
+from typing import Any, Dict
+from metrics import LATENCY_BUCKETS, Histogram, ThreadLocalSeries
+import threading
+import time
+
+class PoolStats:
+    """
+    Connection pool statistics gathered from pymongo's pool events.
+
+    Motor runs pymongo operations on a thread pool, so events arrive on
+    many threads at once. They are recorded in a ThreadLocalSeries, the
+    same lock-free per-thread registry the Prometheus metrics use: counters
+    keyed by event name (and failure reason), plus one histogram of
+    checkout waits. Readers sum every thread's series, which is fine for
+    monitoring even if a read races a write.
+    """
+    def __init__(self):
+        self.series = ThreadLocalSeries()
+        # When this thread's current checkout started; a check-out is
+        # started and completed on the same thread
+        self._checkout = threading.local()
+
+    def count(self, event: str, detail: str = ""):
+        self.series.increment((event, detail))
+
+    def checkout_started(self):
+        self._checkout.started = time.perf_counter()
+
+    def _record_wait(self):
+        started = getattr(self._checkout, "started", 0.0)
+        self._checkout.started = 0.0
+        self.series.observe("wait", time.perf_counter() - started if started else 0.0)
+
+    def checked_out(self):
+        self._record_wait()
+        self.count("checkouts")
+
+    def checkout_failed(self, reason: str):
+        self._record_wait()
+        self.count("failed_checkouts", reason)
+
+    def snapshot(self) -> Dict[str, Any]:
+        histograms, counters = self.series.collect()
+        waits = histograms.get("wait", Histogram())
+        failed = {reason: count for (event, reason), count in counters.items() if event == "failed_checkouts"}
+        checkouts = counters.get(("checkouts", ""), 0)
+        return {
+            "checkouts": checkouts,
+            "failed_checkouts": failed,
+            "in_use": checkouts - counters.get(("checkins", ""), 0),
+            "connections_created": counters.get(("connections_created", ""), 0),
+            "connections_closed": counters.get(("connections_closed", ""), 0),
+            "pool_clears": counters.get(("pool_clears", ""), 0),
+            "wait_ms": {
+                "mean": round(waits.sum / waits.count * 1000, 3) if waits.count else None,
+                "max": round(waits.max * 1000, 3),
+                "histogram": {
+                    **{f"<{bound * 1000:g}": count for bound, count in zip(LATENCY_BUCKETS, waits.buckets)},
+                    f">={LATENCY_BUCKETS[-1] * 1000:g}": waits.buckets[-1]
+                }
+            }
+        }
+
+def create_pool_listener(stats: PoolStats):
+    """
+    Build a pymongo ConnectionPoolListener that feeds stats.
+
+    Defined here rather than at module level so pymongo is only imported
+    when the client is created.
+    """
+    from pymongo import monitoring
+
+    class PoolListener(monitoring.ConnectionPoolListener):
+        def pool_created(self, event):
+            pass
+
+        def pool_ready(self, event):
+            pass
+
+        def pool_cleared(self, event):
+            stats.count("pool_clears")
+
+        def pool_closed(self, event):
+            pass
+
+        def connection_created(self, event):
+            stats.count("connections_created")
+
+        def connection_ready(self, event):
+            pass
+
+        def connection_closed(self, event):
+            stats.count("connections_closed")
+
+        def connection_check_out_started(self, event):
+            stats.checkout_started()
+
+        def connection_check_out_failed(self, event):
+            stats.checkout_failed(str(event.reason))
+
+        def connection_checked_out(self, event):
+            stats.checked_out()
+
+        def connection_checked_in(self, event):
+            stats.count("checkins")
+
+    return PoolListener()
+
+# Shared statistics for the process's Mongo client
+pool_stats = PoolStats()
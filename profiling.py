@@ -0,0 +1,249 @@
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+import inspect
+import io
+import itertools
+import os
+import sys
+import threading
+import time
+
+# Authenticated requests carrying this header are profiled with cProfile
+PROFILE_HEADER = "X-Debug-Profile"
+
+# Requests slower than this are kept with the stack samples taken while they ran (0 disables)
+PROFILE_SLOW_REQUEST_MS = float(os.getenv("PROFILE_SLOW_REQUEST_MS", "0"))
+
+# How often the sampler looks at the event loop's stack
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+
+# Profiles kept for /admin/profiles; the oldest are dropped first
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "50"))
+
+# Bounds on what one profile can hold
+MAX_MONGO_CALLS = 200
+MAX_STACK_DEPTH = 40
+TOP_FUNCTIONS = 40
+TOP_STACKS = 25
+
+class RequestCapture:
+    """What is recorded while one request runs"""
+    def __init__(self, trigger: str):
+        self.trigger = trigger
+        self.started = time.perf_counter()
+        self.mongo_calls: List[Dict[str, Any]] = []
+        self.dropped_calls = 0
+        self.samples: Counter = Counter()
+        self.profiler = None  # cProfile.Profile for header-triggered captures
+
+    def record_call(self, collection: str, operation: str, started: float) -> Optional[Dict[str, Any]]:
+        if len(self.mongo_calls) >= MAX_MONGO_CALLS:
+            self.dropped_calls += 1
+            return None
+        call = {"collection": collection, "operation": operation,
+                "at_ms": round((started - self.started) * 1000, 3), "ms": 0.0}
+        self.mongo_calls.append(call)
+        return call
+
+# The capture of the request being handled, if it is being profiled; read by
+# the collection proxies in config.py
+current_capture: ContextVar[Optional[RequestCapture]] = ContextVar("current_capture", default=None)
+
+async def _timed(awaitable, call: Optional[Dict[str, Any]], started: float):
+    try:
+        return await awaitable
+    finally:
+        if call is not None:
+            call["ms"] = round(call["ms"] + (time.perf_counter() - started) * 1000, 3)
+
+class _ProfiledCursor:
+    """Forwards to a Motor cursor, adding its fetch time to the recorded call"""
+    def __init__(self, cursor, call: Optional[Dict[str, Any]]):
+        self._cursor = cursor
+        self._call = call
+        self._iterator = None
+
+    def __getattr__(self, attribute: str):
+        value = getattr(self._cursor, attribute)
+        if not callable(value):
+            return value
+
+        def forward(*args, **kwargs):
+            started = time.perf_counter()
+            result = value(*args, **kwargs)
+            if result is self._cursor:
+                # Chained modifiers (sort, skip, limit) return the cursor itself
+                return self
+            if inspect.isawaitable(result):
+                return _timed(result, self._call, started)
+            return result
+        return forward
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._iterator is None:
+            self._iterator = self._cursor.__aiter__()
+        return await _timed(self._iterator.__anext__(), self._call, time.perf_counter())
+
+def profile_call(capture: RequestCapture, collection: str, operation: str, method: Callable) -> Callable:
+    """Wrap a collection method so its calls are recorded in capture"""
+    def call(*args, **kwargs):
+        started = time.perf_counter()
+        entry = capture.record_call(collection, operation, started)
+        result = method(*args, **kwargs)
+        if inspect.isawaitable(result):
+            return _timed(result, entry, started)
+        if hasattr(result, "to_list"):
+            # find() and aggregate() return cursors that fetch when iterated
+            return _ProfiledCursor(result, entry)
+        return result
+    return call
+
+def _describe_stack(frame) -> Tuple[str, ...]:
+    """Outermost-first 'function (file:line)' entries of a thread's stack"""
+    stack = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+class StackSampler:
+    """
+    Background thread that samples the event loop thread's stack while
+    requests are in flight, for slow-request capture.
+
+    The handler of an async request does not own a thread, so a sample
+    shows whatever the loop was doing at that moment: the request's own
+    code, another request's, or waiting in the selector (which is where
+    time spent on Mongo round trips shows up). CPU-bound work that blocks
+    the loop, the usual cause of a latency regression, dominates the
+    samples of every request it delays.
+    """
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL_MS / 1000):
+        self.interval = interval
+        self._active: Dict[int, RequestCapture] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._loop_thread_id: Optional[int] = None
+
+    def register(self, capture: RequestCapture) -> int:
+        token = next(self._ids)
+        with self._lock:
+            self._active[token] = capture
+        if self._thread is None:
+            self._loop_thread_id = threading.get_ident()
+            self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+            self._thread.start()
+        return token
+
+    def unregister(self, token: int):
+        with self._lock:
+            self._active.pop(token, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            if not self._active:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = _describe_stack(frame)
+            del frame
+            with self._lock:
+                for capture in self._active.values():
+                    capture.samples[stack] += 1
+
+class RequestProfiler:
+    """
+    Decides which requests to profile and keeps the results in a ring buffer.
+
+    A request is captured when an authenticated caller sends the debug
+    header (cProfile of everything the event loop thread runs until the
+    response starts) or, with PROFILE_SLOW_REQUEST_MS set, when it turns
+    out slower than the threshold (stack samples). Both include the Mongo
+    operations the request made, with their timings.
+    """
+    def __init__(self, slow_ms: float = PROFILE_SLOW_REQUEST_MS, buffer_size: int = PROFILE_BUFFER_SIZE):
+        self.slow_ms = slow_ms
+        self.profiles: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+        self.sampler = StackSampler()
+        self._ids = itertools.count(1)
+        self._profiling = False
+
+    def start(self, request, authorize: Callable[[Any], bool]) -> Optional[Tuple[RequestCapture, Any, Optional[int]]]:
+        """Begin capturing this request if it qualifies; returns a handle for finish()"""
+        if request.headers.get(PROFILE_HEADER) and not self._profiling and authorize(request):
+            # cProfile hooks the whole thread, so only one runs at a time
+            import cProfile
+            capture = RequestCapture("header")
+            capture.profiler = cProfile.Profile()
+            self._profiling = True
+            capture.profiler.enable()
+            return capture, current_capture.set(capture), None
+        if self.slow_ms > 0:
+            capture = RequestCapture("slow")
+            return capture, current_capture.set(capture), self.sampler.register(capture)
+        return None
+
+    def finish(self, handle, request, route: str, status: int, seconds: float):
+        if handle is None:
+            return
+        capture, context_token, sampler_token = handle
+        current_capture.reset(context_token)
+        if sampler_token is not None:
+            self.sampler.unregister(sampler_token)
+
+        profile: Dict[str, Any] = {}
+        if capture.profiler is not None:
+            capture.profiler.disable()
+            self._profiling = False
+            import pstats
+            output = io.StringIO()
+            pstats.Stats(capture.profiler, stream=output).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            profile["profile"] = output.getvalue()
+        elif seconds * 1000 >= self.slow_ms:
+            total = sum(capture.samples.values())
+            profile["samples"] = {
+                "interval_ms": PROFILE_SAMPLE_INTERVAL_MS,
+                "total": total,
+                "stacks": [{"count": count, "stack": list(stack)}
+                           for stack, count in capture.samples.most_common(TOP_STACKS)]
+            }
+        else:
+            return
+
+        self.profiles.append({
+            "id": next(self._ids),
+            "trigger": capture.trigger,
+            "method": request.method,
+            "path": request.url.path,
+            "route": route,
+            "status": status,
+            "duration_ms": round(seconds * 1000, 3),
+            "captured_at": time.time(),
+            "mongo_calls": capture.mongo_calls,
+            "dropped_mongo_calls": capture.dropped_calls,
+            **profile
+        })
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        """The buffered profiles, newest first, without their bulky parts"""
+        hidden = ("profile", "samples", "mongo_calls")
+        return [{**{key: value for key, value in entry.items() if key not in hidden},
+                 "mongo_call_count": len(entry["mongo_calls"])}
+                for entry in reversed(self.profiles)]
+
+    def get(self, profile_id: int) -> Optional[Dict[str, Any]]:
+        for entry in self.profiles:
+            if entry["id"] == profile_id:
+                return entry
+        return None
+
+# Shared profiler instance
+request_profiler = RequestProfiler()
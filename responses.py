@@ -0,0 +1,185 @@
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from typing import Any, Optional, Tuple
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from decimal import Decimal
+from functools import lru_cache
+from pydantic import BaseModel
+import orjson
+import os
+
+# Content types for the stored asset formats
+MEDIA_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "gif": "image/gif",
+    "mp3": "audio/mpeg",
+    "wav": "audio/wav",
+    "ogg": "audio/ogg",
+}
+
+# Blobs are content-addressed, so a given URL + ETag never changes
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Bytes read from disk and sent per http.response.body message
+FILE_CHUNK_SIZE = 256 * 1024
+
+@lru_cache(maxsize=4096)
+def _decimal128_string(bid: bytes) -> str:
+    # Decimal128.to_decimal() is slow and the same prices recur across documents
+    return str(Decimal128.from_bid(bid))
+
+def _encode_bson(value: Any) -> Any:
+    """Fallback for the types orjson does not serialize natively"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return _decimal128_string(value.bid)
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps_mongo(content: Any) -> bytes:
+    """
+    Serialize Mongo documents straight to JSON bytes in one pass.
+
+    orjson writes datetime (ISO 8601, as jsonable_encoder does), dict, list
+    and numeric values natively; ObjectId and Decimal128 go through
+    _encode_bson, so handlers need not stringify _id fields first.
+    """
+    return orjson.dumps(content, default=_encode_bson, option=orjson.OPT_NON_STR_KEYS)
+
+class MongoJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson and BSON-aware encoding.
+
+    The default response class of every router in routes/. Handlers on hot
+    paths return it directly with raw documents, which also skips FastAPI's
+    jsonable_encoder pass over the result.
+    """
+    def render(self, content: Any) -> bytes:
+        return dumps_mongo(content)
+
+class BlobFileResponse(Response):
+    """
+    Sends a byte range of a file on disk.
+
+    The range is read with os.pread() in a worker thread, one chunk at a
+    time, so memory stays flat for large audio files. Every chunk goes out
+    as an ordinary http.response.body message, which is what the HTTP
+    middlewares wrapping the routes expect to receive.
+    """
+    def __init__(self, path: str, offset: int, length: int, status_code: int = 200,
+                 headers: Optional[dict] = None, media_type: Optional[str] = None):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        with open(self.path, "rb") as f:
+            position = self.offset
+            remaining = self.length
+            while remaining > 0:
+                chunk = await run_in_threadpool(os.pread, f.fileno(), min(FILE_CHUNK_SIZE, remaining), position)
+                if not chunk:
+                    break
+                position += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # File shrank underneath us; end the response rather than hang
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=" range into an inclusive (start, end) pair.
+
+    Returns None when the header is absent, malformed (including a last
+    byte before the first, e.g. bytes=5-2) or asks for several ranges; RFC
+    9110 says to ignore such headers and serve the full body. Raises a 416
+    when the range starts beyond the end of the file.
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        return None
+    start_text, end_text = spec.split("-", 1)
+    try:
+        if start_text == "":
+            # Suffix range: the last N bytes
+            suffix = int(end_text)
+            if suffix <= 0:
+                raise ValueError()
+            start, end = max(size - suffix, 0), size - 1
+        else:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+            if end_text and end < start:
+                raise ValueError()
+            end = min(end, size - 1)
+    except ValueError:
+        return None
+    if start >= size:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+def serve_blob(request: Request, path: str, sha256: str, media_type: str) -> Response:
+    """Serve stored asset bytes with a strong ETag, Range support and immutable caching"""
+    etag = f'"{sha256}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        size = os.stat(path).st_size
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Stored content not found")
+
+    # If-Range with a different validator means "send the whole thing"
+    if_range = request.headers.get("if-range")
+    byte_range = None
+    if if_range is None or if_range.strip() == etag:
+        byte_range = parse_range(request.headers.get("range"), size)
+
+    if byte_range is None:
+        return BlobFileResponse(path, 0, size, headers=headers, media_type=media_type)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return BlobFileResponse(path, start, end - start + 1, status_code=206, headers=headers, media_type=media_type)
@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from config import scores_collection, leaderboard_rollups_collection
+import asyncio
+import os
+
+if TYPE_CHECKING:
+    from pymongo import UpdateOne
+
+# Time windows a leaderboard can be filtered by
+ROLLUP_WINDOWS = ("daily", "weekly", "all")
+
+# Entries kept per rollup document (and so the largest servable limit)
+ROLLUP_SIZE = 100
+
+# Expired daily/weekly rollups are kept this long past their period, then deleted
+ROLLUP_RETENTION = timedelta(days=1)
+ROLLUP_EXPIRY_SECONDS = float(os.getenv("ROLLUP_EXPIRY_SECONDS", "3600"))
+
+def period_for(window: str, when: datetime):
+    """Return (period id, period start, expiry time) of the window containing `when`"""
+    if window == "daily":
+        start = datetime(when.year, when.month, when.day)
+        return start.date().isoformat(), start, start + timedelta(days=1) + ROLLUP_RETENTION
+    if window == "weekly":
+        day = datetime(when.year, when.month, when.day)
+        start = day - timedelta(days=day.weekday())
+        year, week, _ = start.isocalendar()
+        return f"{year}-W{week:02d}", start, start + timedelta(weeks=1) + ROLLUP_RETENTION
+    return "all", None, None
+
+def rollup_id(window: str, period: str, game_level: Optional[int]) -> str:
+    return f"{window}:{period}:{'all' if game_level is None else game_level}"
+
+def _rollup_entry(score: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "score_id": str(score["_id"]),
+        "player_name": score["player_name"],
+        "score": score["score"],
+        "game_level": score.get("game_level"),
+        "time_played": score.get("time_played"),
+        "created_at": score.get("created_at"),
+    }
+
+def _push_entries(entries: List[Dict[str, Any]]):
+    # Keep each rollup sorted and capped on the server side
+    return {"$each": entries, "$sort": {"score": -1, "created_at": 1}, "$slice": ROLLUP_SIZE}
+
+def rollup_updates(scores: List[Dict[str, Any]]) -> List["UpdateOne"]:
+    """Upserts that fold new score documents into every rollup they belong to"""
+    from pymongo import UpdateOne
+
+    grouped: Dict[str, Dict[str, Any]] = {}
+    for score in scores:
+        levels = (None,) if score.get("game_level") is None else (None, score["game_level"])
+        for window in ROLLUP_WINDOWS:
+            period, _, expires_at = period_for(window, score["created_at"])
+            for level in levels:
+                key = rollup_id(window, period, level)
+                group = grouped.setdefault(key, {
+                    "window": window, "period": period, "game_level": level,
+                    "expires_at": expires_at, "entries": []
+                })
+                group["entries"].append(_rollup_entry(score))
+
+    return [
+        UpdateOne(
+            {"_id": key},
+            {
+                "$setOnInsert": {k: group[k] for k in ("window", "period", "game_level", "expires_at")},
+                "$push": {"entries": _push_entries(group["entries"])}
+            },
+            upsert=True
+        )
+        for key, group in grouped.items()
+    ]
+
+async def record_scores(scores: List[Dict[str, Any]]):
+    """Apply new scores to their rollups in a single bulk write"""
+    updates = rollup_updates(scores)
+    if updates:
+        await leaderboard_rollups_collection.bulk_write(updates, ordered=False)
+
+async def _backfill_rollup(window: str, game_level: Optional[int], now: datetime):
+    """Seed a rollup from the scores collection, once, via the compound index"""
+    from pymongo.errors import DuplicateKeyError
+
+    period, start, expires_at = period_for(window, now)
+    key = rollup_id(window, period, game_level)
+
+    query: Dict[str, Any] = {}
+    if game_level is not None:
+        query["game_level"] = game_level
+    if start is not None:
+        query["created_at"] = {"$gte": start}
+    scores = await scores_collection.find(query).sort(
+        [("score", -1), ("created_at", 1)]
+    ).limit(ROLLUP_SIZE).to_list(ROLLUP_SIZE)
+
+    try:
+        # Matches only an unseeded (or missing) rollup; a seeded one makes the
+        # upsert collide with its _id, which we treat as "already done"
+        await leaderboard_rollups_collection.update_one(
+            {"_id": key, "backfilled": {"$ne": True}},
+            {
+                "$setOnInsert": {"window": window, "period": period, "game_level": game_level, "expires_at": expires_at},
+                "$set": {"backfilled": True},
+                "$push": {"entries": _push_entries([_rollup_entry(score) for score in scores])}
+            },
+            upsert=True
+        )
+    except DuplicateKeyError:
+        pass
+
+async def backfill_rollups():
+    """Seed the current period's rollups for every level from existing scores"""
+    now = datetime.now()
+    levels = [None] + [level for level in await scores_collection.distinct("game_level") if level is not None]
+    for game_level in levels:
+        for window in ROLLUP_WINDOWS:
+            await _backfill_rollup(window, game_level, now)
+
+async def top_scores(window: str, game_level: Optional[int], limit: int) -> List[Dict[str, Any]]:
+    """Read the top entries of the current period's rollup"""
+    period, _, _ = period_for(window, datetime.now())
+    rollup = await leaderboard_rollups_collection.find_one(
+        {"_id": rollup_id(window, period, game_level)}, {"entries": 1}
+    )
+    if rollup is None:
+        return []
+
+    # A backfill racing a live insert can push the same score twice
+    entries = []
+    seen = set()
+    for entry in rollup["entries"]:
+        if entry["score_id"] not in seen:
+            seen.add(entry["score_id"])
+            entries.append(entry)
+            if len(entries) == limit:
+                break
+    return entries
+
+async def expire_rollups() -> int:
+    result = await leaderboard_rollups_collection.delete_many({"expires_at": {"$lt": datetime.now()}})
+    return result.deleted_count
+
+async def run_rollup_maintenance(interval: float = ROLLUP_EXPIRY_SECONDS):
+    """Background task: seed rollups at startup, then expire finished windows"""
+    try:
+        await backfill_rollups()
+    except Exception as e:
+        print(f"Rollup backfill failed: {str(e)}")
+    while True:
+        try:
+            expired = await expire_rollups()
+            if expired:
+                print(f"Expired {expired} leaderboard rollups")
+        except Exception as e:
+            print(f"Rollup expiry failed: {str(e)}")
+        await asyncio.sleep(interval)
@@ -1,10 +1,15 @@
 from fastapi import APIRouter
+from responses import MongoJSONResponse
 from .sprites import router as sprites_router
 from .audio import router as audio_router
 from .scores import router as scores_router
+from .search import router as search_router
+from .admin import router as admin_router
 
-router = APIRouter()
+router = APIRouter(default_response_class=MongoJSONResponse)
 
 router.include_router(sprites_router)
 router.include_router(audio_router)
-router.include_router(scores_router)
\ No newline at end of file
+router.include_router(scores_router)
+router.include_router(search_router)
+router.include_router(admin_router)
\ No newline at end of file
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, HTTPException, Depends
+from profiling import request_profiler
+from responses import MongoJSONResponse
+from security import api_key_header
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    default_response_class=MongoJSONResponse
+)
+
+@router.get("/profiles", response_description="List captured request profiles")
+async def list_profiles(api_key: str = Depends(api_key_header)):
+    """
+    Lists the profiles held in this worker's ring buffer, newest first.
+
+    Profiles are captured for authenticated requests sent with the
+    X-Debug-Profile header, and for requests slower than
+    PROFILE_SLOW_REQUEST_MS when that is set.
+
+    Database Interaction:
+    - None; profiles are kept in memory
+
+    Security:
+    - Requires the API key; profiles expose request paths and code locations
+    """
+    return MongoJSONResponse(request_profiler.summaries())
+
+@router.get("/profiles/{profile_id}", response_description="Get a captured request profile")
+async def get_profile(profile_id: int, api_key: str = Depends(api_key_header)):
+    """
+    Returns one profile: the cProfile report or the stack samples, plus the
+    Mongo operations the request made and how long each took.
+
+    Database Interaction:
+    - None; profiles are kept in memory
+
+    Security:
+    - Requires the API key
+    """
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return MongoJSONResponse(profile)
@@ -1,61 +1,119 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Request
+from typing import List, Optional
 from bson import ObjectId
 from config import audio_collection
-from security import APIKeyHeader
+from storage import blob_store, MAX_UPLOAD_BYTES, UploadTooLarge
+from pagination import paginate, wants_ndjson
+from responses import serve_blob, dumps_mongo, MEDIA_TYPES, MongoJSONResponse
+from media import probe_audio_duration, compute_wav_peaks, MediaFormatError
+from workers import SingleFlight
+from cache import audio_cache, BodyCache
+from search import search_index
+from versions import collection_versions, not_modified
+from filters import asset_query, facet_counts, DEFAULT_FACET_TAGS, MAX_FACET_TAGS
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from security import api_key_header
+import os
 import re
 
-# Get API key dependency
-api_key_header = APIKeyHeader()
-
 router = APIRouter(
     prefix="/audio",
-    tags=["audio"]
+    tags=["audio"],
+    default_response_class=MongoJSONResponse
 )
 
+# Formats accepted on upload, and by the ?format= filter
+AUDIO_FORMATS = ("mp3", "wav", "ogg")
+
+# Serialized waveform envelopes keyed by (content hash, bucket count), bounded
+# by total size since one ranges from ~100 bytes to ~1 MB at MAX_PEAK_BUCKETS
+PEAK_CACHE_MAX_BYTES = int(os.getenv("PEAK_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+MAX_PEAK_BUCKETS = 10000
+peak_cache = BodyCache(PEAK_CACHE_MAX_BYTES)
+peak_computations = SingleFlight()
+
+async def _find_audio(id: str):
+    """Audio document by ID, through the read-through cache"""
+    async def load():
+        return await audio_collection.find_one({"_id": ObjectId(id)})
+    return await audio_cache.get(ObjectId(id), load)
+
 @router.post("/", response_description="Upload a new audio file")
 async def upload_audio(file: UploadFile = File(...), api_key: str = Depends(api_key_header)):
     """
     Uploads an audio file and stores its metadata.
     
-    Security: Requires API key, validates file extension
+    Security: Requires API key, validates file extension and checks the
+    file's container headers match it
+    
+    Storage: streams the file to the blob store in chunks, recording its size and SHA-256;
+    identical content is stored once and shared between documents
     
     Database Operation: insert_one() to audio_collection
     Returns the inserted document's ID and metadata
     """
     try:
-        # Read file content (in production, you'd upload to S3 or similar)
-        content = await file.read()
-        file_size = len(content)
-        
         # Validate file name for security
         if not re.match(r'^[a-zA-Z0-9_\-\.]+\.(mp3|wav|ogg)$', file.filename):
             raise HTTPException(status_code=400, 
                                 detail="Invalid filename. Use only letters, numbers, underscores, hyphens, and valid audio extensions.")
         
+        # Stream the upload to the blob store in fixed-size chunks
+        try:
+            ingested = await blob_store.ingest(file, MAX_UPLOAD_BYTES["audio"])
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        
+        # Work out the duration from the container headers, rejecting mismatched content
+        try:
+            duration = await run_in_threadpool(probe_audio_duration, ingested.temp_path, ingested.extension)
+        except MediaFormatError as e:
+            blob_store.discard(ingested)
+            raise HTTPException(status_code=400, detail=f"Invalid audio file: {str(e)}")
+        
+        # Reference the stored blob, reusing an identical one if it exists
+        blob = await blob_store.retain(ingested)
+        
+        # Allocate the ID up front so file_path can point at the content endpoint
+        asset_id = ObjectId()
+        
         # Extract file extension
         file_extension = file.filename.split(".")[-1].lower()
         
         # Create an audio document
         audio_data = {
             "name": file.filename.split(".")[0],
-            "file_path": f"/assets/audio/{file.filename}",
-            "duration": 0.0,  # Would be extracted from the actual file in production
+            "_id": asset_id,
+            "file_path": f"/audio/{asset_id}/content",
+            "duration": duration,
             "format": file_extension,
             "tags": ["uploaded", file_extension],
-            "description": f"Uploaded audio: {file.filename}"
+            "description": f"Uploaded audio: {file.filename}",
+            "size": blob.size,
+            "sha256": blob.sha256,
+            "blob_key": blob.blob_key
         }
         
-        # Insert into database
-        result = await audio_collection.insert_one(audio_data)
+        # Insert into database, dropping the blob reference if that fails
+        try:
+            result = await audio_collection.insert_one(audio_data)
+        except Exception:
+            await blob_store.release(blob.sha256)
+            raise
+        search_index.add("audio", str(result.inserted_id), audio_data["name"])
+        await collection_versions.bump("audio")
         
         # Return success response
         return {
             "message": "Audio file uploaded successfully",
             "id": str(result.inserted_id),
             "filename": file.filename,
-            "size": file_size,
-            "format": file_extension
+            "size": blob.size,
+            "sha256": blob.sha256,
+            "deduplicated": blob.deduplicated,
+            "format": file_extension,
+            "duration": duration
         }
     except HTTPException:
         raise
@@ -63,29 +121,68 @@ async def upload_audio(file: UploadFile = File(...), api_key: str = Depends(api_
         raise HTTPException(status_code=500, detail=f"Failed to upload audio file: {str(e)}")
 
 @router.get("/", response_description="List all audio files")
-async def list_audio_files():
+async def list_audio_files(request: Request, cursor: Optional[str] = None, limit: Optional[int] = None,
+                           tags: Optional[str] = None, match: str = "all", format: Optional[str] = None):
     """
-    Retrieves all audio assets from the database.
+    Retrieves audio assets from the database, one page at a time.
     
     Database Interaction:
-    - Queries audio_collection with find() (no filter)
-    - Converts cursor to list (max 1000 documents)
-    - Converts ObjectIds to strings for JSON serialization
+    - Queries audio_collection with find() sorted by _id
+    - Optionally filtered by `tags` (comma-separated; `match=all` requires
+      every tag, `match=any` at least one) and `format`, both indexed
+    - Resumes after the _id encoded in `cursor` (keyset pagination)
+    - Returns the next page's token in the X-Next-Cursor header
+    - Streams every document as NDJSON when Accept: application/x-ndjson
+    - Weak ETag from the collection's version counter; a matching
+      If-None-Match is answered with 304 without querying audio_collection
     """
-    audio_files = await audio_collection.find().to_list(1000)
-    # Convert ObjectId to string for each audio file
-    for audio in audio_files:
-        audio["_id"] = str(audio["_id"])
-    return audio_files
+    query = asset_query(tags, match, format, AUDIO_FORMATS)
+    
+    # Nothing uploaded or deleted since the client's copy
+    etag = collection_versions.etag("audio", "-ndjson" if wants_ndjson(request) else "")
+    if (response := not_modified(request, etag)) is not None:
+        return response
+        
+    response = await paginate(audio_collection, request, cursor=cursor, limit=limit, query=query)
+    if etag is not None:
+        response.headers["ETag"] = etag
+        response.headers["Vary"] = "Accept"
+    return response
+
+@router.get("/facets", response_description="Count audio assets per tag and format")
+async def get_audio_facets(tags: Optional[str] = None, match: str = "all", format: Optional[str] = None,
+                           limit: int = DEFAULT_FACET_TAGS):
+    """
+    Returns per-tag and per-format counts of audio assets, optionally
+    narrowed by the same `tags`/`match`/`format` filters as the list.
+    
+    Database Interaction:
+    - One aggregate() on audio_collection: an indexed $match followed by a
+      $facet with $sortByCount over tags (top `limit`) and format
+    """
+    if not 1 <= limit <= MAX_FACET_TAGS:
+        raise HTTPException(status_code=400, detail=f"Limit must be between 1 and {MAX_FACET_TAGS}")
+        
+    try:
+        query = asset_query(tags, match, format, AUDIO_FORMATS)
+        return await facet_counts(audio_collection, query, limit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to count audio facets: {str(e)}")
 
 @router.get("/{id}", response_description="Get a single audio file by ID")
-async def get_audio_file(id: str):
+async def get_audio_file(id: str, request: Request):
     """
     Retrieves a specific audio file by ID.
     
     Database Interaction:
     - Validates ObjectId format for security
-    - Uses find_one() with filter {"_id": ObjectId(id)}
+    - Uses find_one() with filter {"_id": ObjectId(id)} on a cache miss;
+      found and missing files are both cached for a while
+    - Weak ETag from the collection's version counter and the ID; a
+      matching If-None-Match is answered with 304 once the document is
+      found, which is usually a by-ID cache hit
     - Returns 404 if no document found
     """
     try:
@@ -93,17 +190,96 @@ async def get_audio_file(id: str):
         if not ObjectId.is_valid(id):
             raise HTTPException(status_code=400, detail="Invalid ID format")
             
-        # Get audio from database
-        if (audio := await audio_collection.find_one({"_id": ObjectId(id)})) is not None:
-            # Convert ObjectId to string
-            audio["_id"] = str(audio["_id"])
-            return audio
-        raise HTTPException(status_code=404, detail=f"Audio file with ID {id} not found")
+        # Get audio from cache or database; a missing one is never "not modified"
+        audio = await _find_audio(id)
+        if audio is None:
+            raise HTTPException(status_code=404, detail=f"Audio file with ID {id} not found")
+            
+        etag = collection_versions.etag("audio", f"-{ObjectId(id)}")
+        if (response := not_modified(request, etag)) is not None:
+            return response
+        return MongoJSONResponse(audio, headers={"ETag": etag} if etag else None)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
+@router.get("/{id}/content", response_description="Stream the stored audio file bytes")
+async def get_audio_content(id: str, request: Request):
+    """
+    Serves the stored bytes of an audio file.
+    
+    - Strong ETag from the content hash; If-None-Match returns 304
+    - Honors single Range requests (206 / 416) for audio seeking
+    - Immutable cache headers, since blobs are content-addressed
+    
+    Database Interaction:
+    - Looks the audio file up through the by-ID cache (find_one() on a miss)
+    """
+    try:
+        # Validate ObjectId format
+        if not ObjectId.is_valid(id):
+            raise HTTPException(status_code=400, detail="Invalid ID format")
+            
+        audio = await _find_audio(id)
+        if audio is None:
+            raise HTTPException(status_code=404, detail=f"Audio file with ID {id} not found")
+        if not audio.get("blob_key"):
+            raise HTTPException(status_code=404, detail=f"Audio file with ID {id} has no stored content")
+            
+        return serve_blob(request, blob_store.path_for(audio["blob_key"]), audio["sha256"], MEDIA_TYPES[audio["format"]])
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+@router.get("/{id}/peaks", response_description="Get a waveform peak envelope")
+async def get_audio_peaks(id: str, buckets: int = 1000):
+    """
+    Returns min/max/RMS waveform peaks for an audio file in `buckets` slices.
+    
+    Computed from the memory-mapped PCM data with vectorized NumPy
+    reductions (WAV only) in a worker thread, and cached as JSON per
+    (content hash, bucket count) within PEAK_CACHE_MAX_BYTES.
+    
+    Database Interaction:
+    - Looks the audio file up through the by-ID cache (find_one() on a miss)
+    """
+    try:
+        # Validate ObjectId format and bucket count
+        if not ObjectId.is_valid(id):
+            raise HTTPException(status_code=400, detail="Invalid ID format")
+        if not 1 <= buckets <= MAX_PEAK_BUCKETS:
+            raise HTTPException(status_code=400, detail=f"Buckets must be between 1 and {MAX_PEAK_BUCKETS}")
+            
+        audio = await _find_audio(id)
+        if audio is None:
+            raise HTTPException(status_code=404, detail=f"Audio file with ID {id} not found")
+        if not audio.get("blob_key"):
+            raise HTTPException(status_code=404, detail=f"Audio file with ID {id} has no stored content")
+        if audio["format"] != "wav":
+            raise HTTPException(status_code=415, detail="Waveform peaks are only available for WAV files")
+            
+        cache_key = (audio["sha256"], buckets)
+        if (body := peak_cache.get(cache_key)) is not None:
+            return Response(body, media_type="application/json")
+            
+        async def compute():
+            peaks = await run_in_threadpool(compute_wav_peaks, blob_store.path_for(audio["blob_key"]), buckets)
+            # Cached as the response bytes, which are also smaller than the dict
+            body = dumps_mongo(peaks)
+            peak_cache.put(cache_key, body)
+            return body
+            
+        try:
+            return Response(await peak_computations.run(cache_key, compute), media_type="application/json")
+        except MediaFormatError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to compute peaks: {str(e)}")
+
 @router.delete("/{id}", response_description="Delete an audio file")
 async def delete_audio_file(id: str, api_key: str = Depends(api_key_header)):
     """
@@ -112,17 +288,23 @@ async def delete_audio_file(id: str, api_key: str = Depends(api_key_header)):
     Security: Requires API key, validates ID format
     
     Database Operation: 
-    - Uses delete_one() with filter {"_id": ObjectId(id)}
-    - Verifies deletion by checking deleted_count
+    - Uses find_one_and_delete() with filter {"_id": ObjectId(id)}
+    - Decrements the blob's reference count; orphaned blobs are reclaimed
+      by the background collector
     """
     try:
         # Validate ObjectId format
         if not ObjectId.is_valid(id):
             raise HTTPException(status_code=400, detail="Invalid ID format")
             
-        # Delete from database
-        delete_result = await audio_collection.delete_one({"_id": ObjectId(id)})
-        if delete_result.deleted_count == 1:
+        # Delete from database and drop its reference to the stored blob
+        deleted = await audio_collection.find_one_and_delete({"_id": ObjectId(id)})
+        audio_cache.invalidate(ObjectId(id))
+        if deleted is not None:
+            search_index.remove("audio", str(deleted["_id"]))
+            await collection_versions.bump("audio")
+            if deleted.get("sha256"):
+                await blob_store.release(deleted["sha256"])
             return {"message": f"Audio file with ID {id} deleted successfully"}
         raise HTTPException(status_code=404, detail=f"Audio file with ID {id} not found")
     except HTTPException:
@@ -1,17 +1,23 @@
-from fastapi import APIRouter, HTTPException, Body, Depends
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Body, Depends, Request
+from typing import Any, Dict, List, Optional
 from bson import ObjectId
 from config import scores_collection
-from pydantic import BaseModel, Field
-from security import APIKeyHeader
+from pagination import paginate
+from leaderboard import leaderboard
+from rollups import record_scores, top_scores, ROLLUP_WINDOWS, ROLLUP_SIZE
+from batching import GroupCommitWriter, write_errors_by_index, SCORE_GROUP_COMMIT
+from cache import score_cache
+from responses import MongoJSONResponse
+from versions import not_modified
+from datetime import datetime
+from pydantic import BaseModel, Field, ValidationError
+from security import api_key_header
 import re
 
-# Get API key dependency
-api_key_header = APIKeyHeader()
-
 router = APIRouter(
     prefix="/scores",
-    tags=["scores"]
+    tags=["scores"],
+    default_response_class=MongoJSONResponse
 )
 
 class ScoreInput(BaseModel):
@@ -20,6 +26,40 @@ class ScoreInput(BaseModel):
     game_level: Optional[int] = Field(None, ge=1)
     time_played: Optional[float] = Field(None, ge=0.0)
 
+# Largest number of scores accepted by one batch request
+MAX_BATCH_SCORES = 1000
+
+async def record_new_scores(scores: List[Dict[str, Any]]):
+    """
+    Ranks freshly inserted scores in this worker's leaderboard and folds them
+    into the per-level / time-window rollups. The scores are already stored,
+    so a rollup failure is logged rather than turned into a client retry.
+    """
+    for score_data in scores:
+        leaderboard.add(score_data)
+    try:
+        await record_scores(scores)
+    except Exception as e:
+        print(f"Failed to update leaderboard rollups: {str(e)}")
+
+# Opt-in group commit: concurrent add_score calls share insert_many round trips
+score_writer = GroupCommitWriter(scores_collection, on_commit=record_new_scores) if SCORE_GROUP_COMMIT else None
+
+def _validation_message(error: ValidationError) -> str:
+    """One line per failed field, e.g. 'score: ensure this value is greater than or equal to 0'"""
+    return "; ".join(detail["msg"] if detail["loc"] == ("__root__",)
+                     else f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}"
+                     for detail in error.errors())
+
+def _new_score_document(score: ScoreInput) -> Dict[str, Any]:
+    # Input validation to prevent injection attacks
+    if not re.match(r'^[a-zA-Z0-9_]+$', score.player_name):
+        raise ValueError("Player name can only contain alphanumeric characters and underscores")
+        
+    score_data = score.dict()
+    score_data["created_at"] = score_data["updated_at"] = datetime.now()
+    return score_data
+
 @router.post("/", response_description="Add a new player score")
 async def add_score(score: ScoreInput = Body(...), api_key: str = Depends(api_key_header)):
     """
@@ -27,65 +67,177 @@ async def add_score(score: ScoreInput = Body(...), api_key: str = Depends(api_ke
     
     Security: Requires API key, validates input with Pydantic model
     
-    Database Operation: insert_one() to scores_collection with sanitized data
+    Database Operation: insert_one() to scores_collection with sanitized data,
+    then one bulk_write() of upserts to the leaderboard rollups. With
+    SCORE_GROUP_COMMIT enabled, inserts arriving within a few milliseconds
+    of each other are flushed together as one insert_many()
     Returns the inserted document's ID
     """
     try:
-        # Input validation to prevent injection attacks
-        if not re.match(r'^[a-zA-Z0-9_]+$', score.player_name):
-            raise HTTPException(status_code=400, 
-                              detail="Player name can only contain alphanumeric characters and underscores")
+        # Validate and create score document
+        try:
+            score_data = _new_score_document(score)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # Create score document
-        score_data = score.dict()
-        
-        # Insert into database
-        result = await scores_collection.insert_one(score_data)
+        # Insert into database, coalesced with concurrent inserts if enabled
+        if score_writer is not None:
+            inserted_id = await score_writer.insert(score_data)
+        else:
+            result = await scores_collection.insert_one(score_data)
+            inserted_id = result.inserted_id
+            await record_new_scores([score_data])
         
         # Return success response
         return {
             "message": "Player score added successfully",
-            "id": str(result.inserted_id)
+            "id": str(inserted_id)
         }
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to add player score: {str(e)}")
 
+@router.post("/batch", response_description="Add many player scores at once")
+async def add_scores_batch(scores: List[Any] = Body(...), api_key: str = Depends(api_key_header)):
+    """
+    Adds up to 1000 player scores in one request.
+    
+    Security: Requires API key, validates every item separately, so an
+    invalid item is reported in its result instead of failing the batch
+    
+    Database Operation: one unordered insert_many() to scores_collection, so
+    a bad item does not stop the rest. Returns a result per item, in input
+    order, with either its inserted ID or its error.
+    """
+    if not 1 <= len(scores) <= MAX_BATCH_SCORES:
+        raise HTTPException(status_code=400, detail=f"Batch must contain between 1 and {MAX_BATCH_SCORES} scores")
+        
+    from pymongo.errors import BulkWriteError
+    try:
+        results: List[Dict[str, Any]] = [{"index": index} for index in range(len(scores))]
+        documents = []
+        positions = []
+        for index, item in enumerate(scores):
+            try:
+                documents.append(_new_score_document(ScoreInput.parse_obj(item)))
+                positions.append(index)
+            except ValidationError as e:
+                results[index]["error"] = _validation_message(e)
+            except ValueError as e:
+                results[index]["error"] = str(e)
+                
+        errors: Dict[int, Dict[str, Any]] = {}
+        if documents:
+            try:
+                await scores_collection.insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                errors = write_errors_by_index(e)
+                
+        inserted = []
+        for batch_index, (document, index) in enumerate(zip(documents, positions)):
+            if batch_index in errors:
+                results[index]["error"] = errors[batch_index].get("errmsg", "Write failed")
+            else:
+                results[index]["id"] = str(document["_id"])
+                inserted.append(document)
+                
+        await record_new_scores(inserted)
+        
+        return {
+            "message": f"Added {len(inserted)} of {len(scores)} player scores",
+            "inserted": len(inserted),
+            "failed": len(scores) - len(inserted),
+            "results": results
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to add player scores: {str(e)}")
+
 @router.get("/", response_description="List all player scores")
-async def list_scores():
+async def list_scores(request: Request, cursor: Optional[str] = None, limit: Optional[int] = None):
     """
-    Retrieves all player scores from the database.
+    Retrieves player scores from the database, one page at a time.
     
     Database Interaction:
-    - Queries scores_collection with find() (no filter)
-    - Converts cursor to list (max 1000 documents)
-    - Converts ObjectIds to strings for JSON serialization
-    """
-    scores = await scores_collection.find().to_list(1000)
-    # Convert ObjectId to string for each score
-    for score in scores:
-        score["_id"] = str(score["_id"])
-    return scores
+    - Queries scores_collection with find() sorted by _id
+    - Resumes after the _id encoded in `cursor` (keyset pagination)
+    - Returns the next page's token in the X-Next-Cursor header
+    - Streams every document as NDJSON when Accept: application/x-ndjson
+    """
+    return await paginate(scores_collection, request, cursor=cursor, limit=limit)
+
+@router.get("/top", response_description="Get top scores by level and time window")
+async def get_windowed_top_scores(window: str = "all", game_level: Optional[int] = None, limit: int = 10):
+    """
+    Retrieves the top scores for a time window (daily, weekly or all-time),
+    optionally restricted to one game level.
+    
+    Database Interaction:
+    - A single find_one() on the materialized rollup document for the
+      current period, which add_score keeps sorted and capped
+    - Finished windows are deleted by a background task
+    """
+    if window not in ROLLUP_WINDOWS:
+        raise HTTPException(status_code=400, detail=f"Window must be one of {', '.join(ROLLUP_WINDOWS)}")
+    if game_level is not None and game_level < 1:
+        raise HTTPException(status_code=400, detail="Game level must be a positive integer")
+    if not 1 <= limit <= ROLLUP_SIZE:
+        raise HTTPException(status_code=400, detail=f"Limit must be between 1 and {ROLLUP_SIZE}")
+        
+    return MongoJSONResponse(await top_scores(window, game_level, limit))
 
 @router.get("/top/{limit}", response_description="Get top player scores")
-async def get_top_scores(limit: int = 10):
+async def get_top_scores(request: Request, limit: int = 10):
     """
     Retrieves top-scoring players.
     
-    Database Interaction:
-    - Queries scores_collection with find()
-    - Sorts by score in descending order (-1)
-    - Limits to specified number of results
+    Served from the in-memory leaderboard (an indexable skip list ordered by
+    score), loaded from scores_collection on first use and kept up to date
+    by add_score and a background sync. The weak ETag changes whenever the
+    ranking does, so unchanged boards are answered with 304 (and their
+    compressed body is cached by the compression middleware).
     """
     if limit < 1:
         raise HTTPException(status_code=400, detail="Limit must be a positive integer")
         
-    scores = await scores_collection.find().sort("score", -1).limit(limit).to_list(limit)
-    # Convert ObjectId to string for each score
-    for score in scores:
-        score["_id"] = str(score["_id"])
-    return scores
+    await leaderboard.ensure_loaded(scores_collection)
+    etag = leaderboard.etag()
+    if (response := not_modified(request, etag)) is not None:
+        return response
+    return MongoJSONResponse(leaderboard.top(limit), headers={"ETag": etag})
+
+@router.get("/rank/{player_name}", response_description="Get a player's leaderboard rank")
+async def get_player_rank(player_name: str):
+    """
+    Returns the 1-based rank of a player's best score, in O(log n).
+    """
+    if not re.match(r'^[a-zA-Z0-9_]+$', player_name):
+        raise HTTPException(status_code=400, detail="Invalid player name")
+        
+    await leaderboard.ensure_loaded(scores_collection)
+    if (ranked := leaderboard.rank(player_name)) is None:
+        raise HTTPException(status_code=404, detail=f"No scores found for player {player_name}")
+    rank, entry = ranked
+    return MongoJSONResponse({"player_name": player_name, "rank": rank, "score": entry["score"],
+                              "total_entries": len(leaderboard.entries), "entry": entry})
+
+@router.get("/around/{player_name}", response_description="Get the leaderboard around a player")
+async def get_scores_around_player(player_name: str, radius: int = 5):
+    """
+    Returns the entries ranked within `radius` places of a player's best
+    score, each with its rank.
+    """
+    if not re.match(r'^[a-zA-Z0-9_]+$', player_name):
+        raise HTTPException(status_code=400, detail="Invalid player name")
+    if not 0 <= radius <= 50:
+        raise HTTPException(status_code=400, detail="Radius must be between 0 and 50")
+        
+    await leaderboard.ensure_loaded(scores_collection)
+    if (window := leaderboard.around(player_name, radius)) is None:
+        raise HTTPException(status_code=404, detail=f"No scores found for player {player_name}")
+    return MongoJSONResponse(window)
 
 @router.get("/{id}", response_description="Get a single player score by ID")
 async def get_score(id: str):
@@ -94,7 +246,8 @@ async def get_score(id: str):
     
     Database Interaction:
     - Validates ObjectId format for security
-    - Uses find_one() with filter {"_id": ObjectId(id)}
+    - Uses find_one() with filter {"_id": ObjectId(id)} on a cache miss;
+      found and missing scores are both cached for a while
     - Returns 404 if no document found
     """
     try:
@@ -102,11 +255,12 @@ async def get_score(id: str):
         if not ObjectId.is_valid(id):
             raise HTTPException(status_code=400, detail="Invalid ID format")
             
-        # Get score from database
-        if (score := await scores_collection.find_one({"_id": ObjectId(id)})) is not None:
-            # Convert ObjectId to string
-            score["_id"] = str(score["_id"])
-            return score
+        async def load():
+            return await scores_collection.find_one({"_id": ObjectId(id)})
+            
+        # Get score from cache or database
+        if (score := await score_cache.get(ObjectId(id), load)) is not None:
+            return MongoJSONResponse(score)
         raise HTTPException(status_code=404, detail=f"Player score with ID {id} not found")
     except HTTPException:
         raise
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+from config import sprites_collection, audio_collection
+from search import search_index
+from responses import MongoJSONResponse
+import re
+
+router = APIRouter(
+    prefix="/search",
+    tags=["search"],
+    default_response_class=MongoJSONResponse
+)
+
+def search_collections():
+    return {"sprites": sprites_collection, "audio": audio_collection}
+
+@router.get("/", response_description="Autocomplete sprite and audio names")
+async def search_assets(q: str, kind: Optional[str] = None, limit: int = 10):
+    """
+    Suggests assets whose names start with, or closely resemble, `q`.
+    
+    Served from the in-process name index (sorted prefix keys plus a
+    trigram index), so no database query is made per keystroke.
+    
+    Database Interaction:
+    - None per request; the index is built from sprites_collection and
+      audio_collection at startup and kept current by uploads, deletes and
+      a periodic rebuild
+    """
+    # Input validation to prevent injection attacks
+    if not re.match(r'^[a-zA-Z0-9_\-\.]{1,100}$', q):
+        raise HTTPException(status_code=400, detail="Query can only contain alphanumeric characters, underscores, hyphens and dots")
+    if kind is not None and kind not in search_index.kinds:
+        raise HTTPException(status_code=400, detail=f"Kind must be one of {', '.join(search_index.kinds)}")
+    if not 1 <= limit <= 50:
+        raise HTTPException(status_code=400, detail="Limit must be between 1 and 50")
+        
+    try:
+        await search_index.ensure_loaded(search_collections())
+        return MongoJSONResponse(search_index.search(q, kind, limit))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
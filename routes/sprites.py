@@ -1,62 +1,136 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Request, Body
+from typing import List, Optional
 from bson import ObjectId
 from config import sprites_collection
-from security import APIKeyHeader
+from storage import blob_store, MAX_UPLOAD_BYTES, UploadTooLarge
+from pagination import paginate, wants_ndjson
+from responses import serve_blob, MEDIA_TYPES, MongoJSONResponse
+from media import probe_image_dimensions, MediaFormatError
+from starlette.concurrency import run_in_threadpool
+from models import AtlasRequest
+from atlas import atlas_cache_key, build_atlas, AtlasPackingError, ATLAS_CACHE_MAX_BYTES
+from workers import run_in_process, SingleFlight
+from variants import VariantCache, VARIANT_SIZES
+from disk_cache import DiskLRU
+from cache import sprite_cache
+from search import search_index
+from versions import collection_versions, not_modified
+from filters import asset_query, facet_counts, DEFAULT_FACET_TAGS, MAX_FACET_TAGS
+import json
+from security import api_key_header
 import re
 
-# Get API key dependency
-api_key_header = APIKeyHeader()
-
 router = APIRouter(
     prefix="/sprites",
-    tags=["sprites"]
+    tags=["sprites"],
+    default_response_class=MongoJSONResponse
 )
 
+# Formats accepted on upload, and by the ?format= filter
+SPRITE_FORMATS = ("png", "jpg", "jpeg", "gif")
+
+# Concurrent requests for the same atlas share one build
+atlas_builds = SingleFlight()
+
+# Thumbnails and downscales, generated on first request
+variant_cache = VariantCache(blob_store.path_for("variants"))
+
+# Built atlases on disk, each a PNG with its JSON layout
+atlas_files = DiskLRU(blob_store.path_for("atlases"), ATLAS_CACHE_MAX_BYTES, companions=(".json",))
+
+async def _find_sprite(id: str):
+    """Sprite document by ID, through the read-through cache"""
+    async def load():
+        return await sprites_collection.find_one({"_id": ObjectId(id)})
+    return await sprite_cache.get(ObjectId(id), load)
+
+def _atlas_path(key: str) -> str:
+    return blob_store.path_for(f"atlases/{key}.png")
+
+def _read_atlas_layout(key: str):
+    try:
+        with open(_atlas_path(key)[:-len(".png")] + ".json") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
 @router.post("/", response_description="Upload a new sprite")
 async def upload_sprite(file: UploadFile = File(...), api_key: str = Depends(api_key_header)):
     """
     Uploads a sprite file and stores its metadata in the database.
     
-    Security: Requires API key, validates filename pattern to prevent injection
+    Security: Requires API key, validates filename pattern to prevent injection,
+    and checks the file's header matches its extension
+    
+    Storage: streams the file to the blob store in chunks, recording its size and SHA-256;
+    identical content is stored once and shared between documents
     
     Database Operation: insert_one() to sprites_collection
     Returns the inserted document's ID and metadata
     """
     try:
-        # Read file content (in production, you'd upload to S3 or similar)
-        content = await file.read()
-        file_size = len(content)
-        
         # Validate file name for security
         if not re.match(r'^[a-zA-Z0-9_\-\.]+\.(png|jpg|jpeg|gif)$', file.filename):
             raise HTTPException(status_code=400, 
                                 detail="Invalid filename. Use only letters, numbers, underscores, hyphens, and valid image extensions.")
         
+        # Stream the upload to the blob store in fixed-size chunks
+        try:
+            ingested = await blob_store.ingest(file, MAX_UPLOAD_BYTES["sprites"])
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        
+        # Read the real dimensions from the image header, rejecting mismatched content
+        try:
+            width, height = await run_in_threadpool(probe_image_dimensions, ingested.temp_path, ingested.extension)
+        except MediaFormatError as e:
+            blob_store.discard(ingested)
+            raise HTTPException(status_code=400, detail=f"Invalid image file: {str(e)}")
+        
+        # Reference the stored blob, reusing an identical one if it exists
+        blob = await blob_store.retain(ingested)
+        
+        # Allocate the ID up front so file_path can point at the content endpoint
+        asset_id = ObjectId()
+        
         # Extract file extension
         file_extension = file.filename.split(".")[-1].lower()
         
         # Create a sprite document
         sprite_data = {
             "name": file.filename.split(".")[0],
-            "file_path": f"/assets/sprites/{file.filename}",
-            "width": 64,  # Default values for demo
-            "height": 64,  # Default values for demo
+            "_id": asset_id,
+            "file_path": f"/sprites/{asset_id}/content",
+            "width": width,
+            "height": height,
             "format": file_extension,
             "tags": ["uploaded", file_extension],
-            "description": f"Uploaded sprite: {file.filename}"
+            "description": f"Uploaded sprite: {file.filename}",
+            "size": blob.size,
+            "sha256": blob.sha256,
+            "blob_key": blob.blob_key
         }
         
-        # Insert into database
-        result = await sprites_collection.insert_one(sprite_data)
+        # Insert into database, dropping the blob reference if that fails
+        try:
+            result = await sprites_collection.insert_one(sprite_data)
+        except Exception:
+            await blob_store.release(blob.sha256)
+            raise
+        search_index.add("sprites", str(result.inserted_id), sprite_data["name"])
+        await collection_versions.bump("sprites")
         
         # Return success response
         return {
             "message": "Sprite uploaded successfully",
             "id": str(result.inserted_id),
             "filename": file.filename,
-            "size": file_size,
-            "format": file_extension
+            "size": blob.size,
+            "sha256": blob.sha256,
+            "deduplicated": blob.deduplicated,
+            "format": file_extension,
+            "width": width,
+            "height": height
         }
     except HTTPException:
         raise
@@ -64,29 +138,146 @@ async def upload_sprite(file: UploadFile = File(...), api_key: str = Depends(api
         raise HTTPException(status_code=500, detail=f"Failed to upload sprite: {str(e)}")
 
 @router.get("/", response_description="List all sprites")
-async def list_sprites():
+async def list_sprites(request: Request, cursor: Optional[str] = None, limit: Optional[int] = None,
+                       tags: Optional[str] = None, match: str = "all", format: Optional[str] = None):
+    """
+    Retrieves sprite assets from the database, one page at a time.
+    
+    Database Interaction:
+    - Queries sprites_collection with find() sorted by _id
+    - Optionally filtered by `tags` (comma-separated; `match=all` requires
+      every tag, `match=any` at least one) and `format`, both indexed
+    - Resumes after the _id encoded in `cursor` (keyset pagination)
+    - Returns the next page's token in the X-Next-Cursor header
+    - Streams every document as NDJSON when Accept: application/x-ndjson
+    - Weak ETag from the collection's version counter; a matching
+      If-None-Match is answered with 304 without querying sprites_collection
+    """
+    query = asset_query(tags, match, format, SPRITE_FORMATS)
+    
+    # Nothing uploaded or deleted since the client's copy
+    etag = collection_versions.etag("sprites", "-ndjson" if wants_ndjson(request) else "")
+    if (response := not_modified(request, etag)) is not None:
+        return response
+        
+    response = await paginate(sprites_collection, request, cursor=cursor, limit=limit, query=query)
+    if etag is not None:
+        response.headers["ETag"] = etag
+        response.headers["Vary"] = "Accept"
+    return response
+
+@router.get("/facets", response_description="Count sprite assets per tag and format")
+async def get_sprite_facets(tags: Optional[str] = None, match: str = "all", format: Optional[str] = None,
+                            limit: int = DEFAULT_FACET_TAGS):
     """
-    Retrieves all sprite assets from the database.
+    Returns per-tag and per-format counts of sprite assets, optionally
+    narrowed by the same `tags`/`match`/`format` filters as the list.
     
     Database Interaction:
-    - Queries sprites_collection with find() (no filter)
-    - Converts cursor to list (max 1000 documents)
-    - Converts ObjectIds to strings for JSON serialization
+    - One aggregate() on sprites_collection: an indexed $match followed by a
+      $facet with $sortByCount over tags (top `limit`) and format
+    """
+    if not 1 <= limit <= MAX_FACET_TAGS:
+        raise HTTPException(status_code=400, detail=f"Limit must be between 1 and {MAX_FACET_TAGS}")
+        
+    try:
+        query = asset_query(tags, match, format, SPRITE_FORMATS)
+        return await facet_counts(sprites_collection, query, limit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to count sprite facets: {str(e)}")
+
+@router.post("/atlas", response_description="Pack sprites into a texture atlas")
+async def create_sprite_atlas(atlas_request: AtlasRequest = Body(...), api_key: str = Depends(api_key_header)):
+    """
+    Packs the requested sprites into one texture atlas.
+    
+    Returns the atlas dimensions, a frame map of sprite ID -> {x, y, w, h}
+    and the URL of the atlas PNG. Packing (skyline bottom-left) and
+    compositing run in the worker process pool, and results are cached on
+    disk under a key made from the sorted content hashes and options, so a
+    repeat request for the same set is served without rebuilding. The
+    cache is bounded by ATLAS_CACHE_MAX_BYTES, least recently used first.
+    
+    Security: Requires API key (builds use the process pool and disk)
+    
+    Database Interaction:
+    - Uses find() with filter {"_id": {"$in": [...]}}, projecting only the
+      blob fields
+    """
+    try:
+        # Validate ObjectId format
+        sprite_ids = atlas_request.sprite_ids
+        if not all(ObjectId.is_valid(sprite_id) for sprite_id in sprite_ids):
+            raise HTTPException(status_code=400, detail="Invalid ID format")
+            
+        unique_ids = list({ObjectId(sprite_id) for sprite_id in sprite_ids})
+        sprites = await sprites_collection.find(
+            {"_id": {"$in": unique_ids}}, {"sha256": 1, "blob_key": 1}
+        ).to_list(len(unique_ids))
+        by_id = {str(sprite["_id"]): sprite for sprite in sprites if sprite.get("blob_key")}
+        
+        missing = [sprite_id for sprite_id in sprite_ids if sprite_id not in by_id]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Sprites not found or without stored content: {', '.join(missing)}")
+            
+        # Identical content is packed once, however many IDs point at it
+        entries = {sprite["sha256"]: blob_store.path_for(sprite["blob_key"]) for sprite in by_id.values()}
+        key = atlas_cache_key(list(entries), atlas_request.padding, atlas_request.power_of_two, atlas_request.max_size)
+        
+        async def load_or_build():
+            await atlas_files.ensure_loaded()
+            layout = await run_in_threadpool(_read_atlas_layout, key)
+            if layout is None:
+                layout = await run_in_process(
+                    build_atlas, sorted(entries.items()), atlas_request.padding,
+                    atlas_request.power_of_two, atlas_request.max_size, _atlas_path(key)
+                )
+                await atlas_files.add(_atlas_path(key), await run_in_threadpool(atlas_files.entry_size, _atlas_path(key)))
+            else:
+                await atlas_files.hit(_atlas_path(key))
+            return layout
+            
+        try:
+            layout = await atlas_builds.run(key, load_or_build)
+        except AtlasPackingError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+            
+        return {
+            "key": key,
+            "image_url": f"/sprites/atlas/{key}",
+            "width": layout["width"],
+            "height": layout["height"],
+            "frames": {sprite_id: layout["frames"][by_id[sprite_id]["sha256"]] for sprite_id in sprite_ids}
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to build atlas: {str(e)}")
+
+@router.get("/atlas/{key}", response_description="Download a packed texture atlas")
+async def get_sprite_atlas(key: str, request: Request):
     """
-    sprites = await sprites_collection.find().to_list(1000)
-    # Convert ObjectId to string for each sprite
-    for sprite in sprites:
-        sprite["_id"] = str(sprite["_id"])
-    return sprites
+    Serves a previously built atlas PNG by its cache key.
+    """
+    if not re.match(r'^[0-9a-f]{64}$', key):
+        raise HTTPException(status_code=400, detail="Invalid atlas key")
+    await atlas_files.hit(_atlas_path(key))
+    return serve_blob(request, _atlas_path(key), key, "image/png")
 
 @router.get("/{id}", response_description="Get a single sprite by ID")
-async def get_sprite(id: str):
+async def get_sprite(id: str, request: Request):
     """
     Retrieves a specific sprite by ID.
     
     Database Interaction:
     - Validates ObjectId format for security
-    - Uses find_one() with filter {"_id": ObjectId(id)}
+    - Uses find_one() with filter {"_id": ObjectId(id)} on a cache miss;
+      found and missing sprites are both cached for a while
+    - Weak ETag from the collection's version counter and the ID; a
+      matching If-None-Match is answered with 304 once the document is
+      found, which is usually a by-ID cache hit
     - Returns 404 if no document found
     """
     try:
@@ -94,17 +285,81 @@ async def get_sprite(id: str):
         if not ObjectId.is_valid(id):
             raise HTTPException(status_code=400, detail="Invalid ID format")
             
-        # Get sprite from database
-        if (sprite := await sprites_collection.find_one({"_id": ObjectId(id)})) is not None:
-            # Convert ObjectId to string
-            sprite["_id"] = str(sprite["_id"])
-            return sprite
-        raise HTTPException(status_code=404, detail=f"Sprite with ID {id} not found")
+        # Get sprite from cache or database; a missing one is never "not modified"
+        sprite = await _find_sprite(id)
+        if sprite is None:
+            raise HTTPException(status_code=404, detail=f"Sprite with ID {id} not found")
+            
+        etag = collection_versions.etag("sprites", f"-{ObjectId(id)}")
+        if (response := not_modified(request, etag)) is not None:
+            return response
+        return MongoJSONResponse(sprite, headers={"ETag": etag} if etag else None)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+@router.get("/{id}/content", response_description="Stream the stored sprite bytes")
+async def get_sprite_content(id: str, request: Request):
+    """
+    Serves the stored bytes of a sprite.
+    
+    - Strong ETag from the content hash; If-None-Match returns 304
+    - Honors single Range requests (206 / 416)
+    - Immutable cache headers, since blobs are content-addressed
+    
+    Database Interaction:
+    - Looks the sprite up through the by-ID cache (find_one() on a miss)
+    """
+    try:
+        # Validate ObjectId format
+        if not ObjectId.is_valid(id):
+            raise HTTPException(status_code=400, detail="Invalid ID format")
+            
+        sprite = await _find_sprite(id)
+        if sprite is None:
+            raise HTTPException(status_code=404, detail=f"Sprite with ID {id} not found")
+        if not sprite.get("blob_key"):
+            raise HTTPException(status_code=404, detail=f"Sprite with ID {id} has no stored content")
+            
+        return serve_blob(request, blob_store.path_for(sprite["blob_key"]), sprite["sha256"], MEDIA_TYPES[sprite["format"]])
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
+@router.get("/{id}/variants/{size}", response_description="Get a downscaled sprite variant")
+async def get_sprite_variant(id: str, size: int, request: Request):
+    """
+    Serves a PNG thumbnail of a sprite whose longest edge is at most `size`.
+    
+    Variants are rendered in the worker process pool on first request and
+    kept in a bounded LRU cache on disk, keyed by content hash.
+    
+    Database Interaction:
+    - Looks the sprite up through the by-ID cache (find_one() on a miss)
+    """
+    try:
+        # Validate ObjectId format and size
+        if not ObjectId.is_valid(id):
+            raise HTTPException(status_code=400, detail="Invalid ID format")
+        if size not in VARIANT_SIZES:
+            raise HTTPException(status_code=400,
+                                detail=f"Size must be one of {', '.join(str(s) for s in VARIANT_SIZES)}")
+            
+        sprite = await _find_sprite(id)
+        if sprite is None:
+            raise HTTPException(status_code=404, detail=f"Sprite with ID {id} not found")
+        if not sprite.get("blob_key"):
+            raise HTTPException(status_code=404, detail=f"Sprite with ID {id} has no stored content")
+            
+        path = await variant_cache.get(sprite["sha256"], blob_store.path_for(sprite["blob_key"]), size)
+        return serve_blob(request, path, f"{sprite['sha256']}-{size}", "image/png")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to generate variant: {str(e)}")
+
 @router.delete("/{id}", response_description="Delete a sprite")
 async def delete_sprite(id: str, api_key: str = Depends(api_key_header)):
     """
@@ -113,17 +368,23 @@ async def delete_sprite(id: str, api_key: str = Depends(api_key_header)):
     Security: Requires API key, validates ID format
     
     Database Operation: 
-    - Uses delete_one() with filter {"_id": ObjectId(id)}
-    - Verifies deletion by checking deleted_count
+    - Uses find_one_and_delete() with filter {"_id": ObjectId(id)}
+    - Decrements the blob's reference count; orphaned blobs are reclaimed
+      by the background collector
     """
     try:
         # Validate ObjectId format
         if not ObjectId.is_valid(id):
             raise HTTPException(status_code=400, detail="Invalid ID format")
             
-        # Delete from database
-        delete_result = await sprites_collection.delete_one({"_id": ObjectId(id)})
-        if delete_result.deleted_count == 1:
+        # Delete from database and drop its reference to the stored blob
+        deleted = await sprites_collection.find_one_and_delete({"_id": ObjectId(id)})
+        sprite_cache.invalidate(ObjectId(id))
+        if deleted is not None:
+            search_index.remove("sprites", str(deleted["_id"]))
+            await collection_versions.bump("sprites")
+            if deleted.get("sha256"):
+                await blob_store.release(deleted["sha256"])
             return {"message": f"Sprite with ID {id} deleted successfully"}
         raise HTTPException(status_code=404, detail=f"Sprite with ID {id} not found")
     except HTTPException:
@@ -0,0 +1,287 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+from starlette.concurrency import run_in_threadpool
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+import asyncio
+import math
+import os
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# How often each worker rebuilds its index to pick up other workers' changes
+SEARCH_REFRESH_SECONDS = float(os.getenv("SEARCH_REFRESH_SECONDS", "60"))
+
+# Names fetched per round trip during a rebuild; the event loop gets a turn
+# between batches
+SEARCH_REBUILD_BATCH_SIZE = 5000
+
+# Share of the query's trigrams a name must contain to be suggested
+FUZZY_THRESHOLD = 0.5
+
+# Short queries need only this many fewer than all of their trigrams: one
+# typo in a four-letter word already breaks two of its three
+FUZZY_TYPO_ALLOWANCE = 2
+
+def required_shared_trigrams(total_grams: int) -> int:
+    """Trigrams a name must share with a query that has total_grams of them"""
+    return max(1, min(math.ceil(FUZZY_THRESHOLD * total_grams), total_grams - FUZZY_TYPO_ALLOWANCE))
+
+def trigrams(text: str, partial: bool = False) -> Set[str]:
+    """
+    Trigrams of a lowercased name, padded so its start and end count too.
+    A partial (still being typed) query is not padded at the end.
+    """
+    padded = f" {text}" if partial else f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class NameIndex:
+    """
+    Autocomplete index over the names of one kind of asset.
+
+    Prefix lookups bisect a sorted array of (lowercased name, id) keys, which
+    is a trie flattened into one list: every name under a prefix sits in one
+    contiguous run, found in O(log n). Fuzzy lookups score names by the share
+    of the query's trigrams they contain, so typos and missing letters still
+    match. Each name gets an integer slot; the inverted index maps trigrams
+    to sets of slots, mirrored as NumPy arrays so a query's posting lists
+    are counted with one bincount instead of a Python loop. NumPy is only
+    imported once the first name is added, keeping it out of cold starts.
+    """
+    def __init__(self):
+        self.names: Dict[str, str] = {}
+        self.keys: List[Tuple[str, str]] = []
+        self.postings: Dict[str, Set[int]] = defaultdict(set)
+        self._posting_arrays: Dict[str, "np.ndarray"] = {}
+        self._slots: Dict[str, int] = {}
+        self._slot_ids: List[Optional[str]] = []
+        self._free_slots: List[int] = []
+        self._lengths: Optional["np.ndarray"] = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def build(cls, entries: List[Tuple[str, str]]) -> "NameIndex":
+        """
+        Index (id, name) pairs in one pass: the keys are sorted once rather
+        than insorted one at a time, and the posting arrays are made up
+        front so the first queries do not pay for them. CPU-bound, so
+        rebuilds run it in a worker thread.
+        """
+        import numpy as np
+
+        index = cls()
+        lengths = []
+        for asset_id, name in entries:
+            if asset_id in index.names:
+                continue
+            key = name.lower()
+            slot = len(index._slot_ids)
+            index.names[asset_id] = name
+            index.keys.append((key, asset_id))
+            index._slot_ids.append(asset_id)
+            index._slots[asset_id] = slot
+            lengths.append(len(key))
+            for gram in trigrams(key):
+                index.postings[gram].add(slot)
+        index.keys.sort()
+        index._lengths = np.zeros(max(1024, 2 * len(lengths)), dtype=np.int32)
+        index._lengths[:len(lengths)] = lengths
+        for gram in index.postings:
+            index._posting_array(gram)
+        return index
+
+    def _allocate_slot(self, asset_id: str, length: int) -> int:
+        import numpy as np
+
+        if self._lengths is None:
+            self._lengths = np.zeros(1024, dtype=np.int32)
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._slot_ids[slot] = asset_id
+        else:
+            slot = len(self._slot_ids)
+            self._slot_ids.append(asset_id)
+            if slot >= len(self._lengths):
+                self._lengths = np.concatenate([self._lengths, np.zeros_like(self._lengths)])
+        self._lengths[slot] = length
+        self._slots[asset_id] = slot
+        return slot
+
+    def add(self, asset_id: str, name: str):
+        if asset_id in self.names:
+            self.remove(asset_id)
+        key = name.lower()
+        self.names[asset_id] = name
+        insort(self.keys, (key, asset_id))
+        slot = self._allocate_slot(asset_id, len(key))
+        for gram in trigrams(key):
+            self.postings[gram].add(slot)
+            self._posting_arrays.pop(gram, None)
+
+    def remove(self, asset_id: str):
+        name = self.names.pop(asset_id, None)
+        if name is None:
+            return
+        key = name.lower()
+        position = bisect_left(self.keys, (key, asset_id))
+        if position < len(self.keys) and self.keys[position] == (key, asset_id):
+            del self.keys[position]
+        slot = self._slots.pop(asset_id)
+        for gram in trigrams(key):
+            slots = self.postings.get(gram)
+            if slots is not None:
+                slots.discard(slot)
+                if not slots:
+                    del self.postings[gram]
+            self._posting_arrays.pop(gram, None)
+        self._slot_ids[slot] = None
+        self._free_slots.append(slot)
+
+    def _posting_array(self, gram: str) -> "np.ndarray":
+        import numpy as np
+
+        array = self._posting_arrays.get(gram)
+        if array is None:
+            slots = self.postings.get(gram, ())
+            array = np.fromiter(slots, dtype=np.int32, count=len(slots))
+            self._posting_arrays[gram] = array
+        return array
+
+    def prefix(self, query: str, limit: int) -> List[str]:
+        """Ids of names starting with query, alphabetically"""
+        query = query.lower()
+        matches = []
+        position = bisect_left(self.keys, (query,))
+        while position < len(self.keys) and len(matches) < limit:
+            key, asset_id = self.keys[position]
+            if not key.startswith(query):
+                break
+            matches.append(asset_id)
+            position += 1
+        return matches
+
+    def fuzzy(self, query: str, limit: int, exclude: Set[str]) -> List[Tuple[str, float]]:
+        """(id, similarity) of the names most similar to query, best first"""
+        import numpy as np
+
+        all_grams = trigrams(query.lower(), partial=True)
+        query_grams = [gram for gram in all_grams if gram in self.postings]
+        if not query_grams:
+            return []
+        total_grams = len(all_grams)
+        shared = np.bincount(np.concatenate([self._posting_array(gram) for gram in query_grams]),
+                             minlength=len(self._slot_ids))
+        candidates = np.flatnonzero(shared >= required_shared_trigrams(total_grams))
+        if not len(candidates):
+            return []
+
+        # More shared trigrams first, then shorter (closer) names
+        ranking = shared[candidates].astype(np.int64) * 65536 - self._lengths[candidates]
+        wanted = min(limit + len(exclude), len(candidates))
+        top = candidates[np.argpartition(-ranking, wanted - 1)[:wanted]]
+        top = top[np.argsort(-(shared[top].astype(np.int64) * 65536 - self._lengths[top]), kind="stable")]
+
+        matches = []
+        for slot in top:
+            asset_id = self._slot_ids[slot]
+            if asset_id not in exclude:
+                matches.append((asset_id, int(shared[slot]) / total_grams))
+                if len(matches) == limit:
+                    break
+        return matches
+
+def _build_indexes(entries: Dict[str, List[Tuple[str, str]]]) -> Dict[str, NameIndex]:
+    return {kind: NameIndex.build(kind_entries) for kind, kind_entries in entries.items()}
+
+class SearchIndex:
+    """
+    In-process name search across asset kinds, for editor type-ahead.
+
+    Built from the asset collections on startup and updated directly by
+    uploads and deletes. Every worker keeps its own copy, so a background
+    task periodically rebuilds it to pick up other workers' changes. A
+    rebuild reads the names in batches and indexes them in a worker thread;
+    updates made meanwhile are replayed onto the result before it is
+    swapped in.
+    """
+    def __init__(self, kinds: Tuple[str, ...] = ("sprites", "audio")):
+        self.kinds = kinds
+        self.indexes: Dict[str, NameIndex] = {kind: NameIndex() for kind in kinds}
+        self.loaded = False
+        self._build_lock = asyncio.Lock()
+        self._journal: Optional[List[Tuple[str, str, str, Optional[str]]]] = None
+
+    def add(self, kind: str, asset_id: str, name: str):
+        self.indexes[kind].add(asset_id, name)
+        if self._journal is not None:
+            self._journal.append(("add", kind, asset_id, name))
+
+    def remove(self, kind: str, asset_id: str):
+        self.indexes[kind].remove(asset_id)
+        if self._journal is not None:
+            self._journal.append(("remove", kind, asset_id, None))
+
+    async def rebuild(self, collections: Dict[str, Any]):
+        """Re-read every name and swap in the fresh index"""
+        async with self._build_lock:
+            self._journal = []
+            try:
+                entries: Dict[str, List[Tuple[str, str]]] = {kind: [] for kind in self.kinds}
+                for kind in self.kinds:
+                    cursor = collections[kind].find({}, {"name": 1}).batch_size(SEARCH_REBUILD_BATCH_SIZE)
+                    async for document in cursor:
+                        if document.get("name"):
+                            entries[kind].append((str(document["_id"]), document["name"]))
+                # Indexing is CPU-bound; building off the event loop keeps requests flowing
+                fresh = await run_in_threadpool(_build_indexes, entries)
+                for operation, kind, asset_id, name in self._journal:
+                    if operation == "add":
+                        fresh[kind].add(asset_id, name)
+                    else:
+                        fresh[kind].remove(asset_id)
+                self.indexes = fresh
+                self.loaded = True
+            finally:
+                self._journal = None
+
+    async def ensure_loaded(self, collections: Dict[str, Any]):
+        if not self.loaded:
+            await self.rebuild(collections)
+
+    async def run_refresh(self, collections: Dict[str, Any], interval: float = SEARCH_REFRESH_SECONDS):
+        """Background task that builds the index, then keeps rebuilding it"""
+        while True:
+            try:
+                await self.rebuild(collections)
+            except Exception as e:
+                print(f"Search index rebuild failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+    def search(self, query: str, kind: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """Prefix matches first, then fuzzy matches to fill up to limit"""
+        kinds = (kind,) if kind else self.kinds
+        results = []
+        for name_kind in kinds:
+            index = self.indexes[name_kind]
+            for asset_id in index.prefix(query, limit):
+                results.append({"id": asset_id, "kind": name_kind, "name": index.names[asset_id],
+                                "match": "prefix", "score": 1.0})
+        results.sort(key=lambda result: result["name"].lower())
+        del results[limit:]
+
+        if len(results) < limit and len(query) >= 2:
+            found = {result["id"] for result in results}
+            fuzzy = []
+            for name_kind in kinds:
+                index = self.indexes[name_kind]
+                for asset_id, similarity in index.fuzzy(query, limit - len(results), found):
+                    fuzzy.append({"id": asset_id, "kind": name_kind, "name": index.names[asset_id],
+                                  "match": "fuzzy", "score": round(similarity, 3)})
+            fuzzy.sort(key=lambda result: -result["score"])
+            results.extend(fuzzy[:limit - len(results)])
+        return results
+
+# Shared search index instance
+search_index = SearchIndex()
@@ -4,8 +4,15 @@ from fastapi.responses import JSONResponse
 import os
 from dotenv import load_dotenv
 from typing import Optional, Dict, Any, List
+from collections import OrderedDict
+import hashlib
+import json
+import struct
+import mmap
+import fcntl
 import time
 import re
+from urllib.parse import unquote_plus
 
 # Load environment variables
 load_dotenv()
@@ -13,6 +20,23 @@ load_dotenv()
 # Get API key from environment
 API_KEY = os.getenv("API_KEY", "test_api_key")
 
+# NoSQL injection / path traversal patterns, compiled once into single
+# alternations so each input is scanned in one pass instead of once per pattern
+_OPERATOR_PATTERN = r'\$(?:where|ne|gt|lt|regex|exists)'
+_TRAVERSAL_PATTERN = r'\.\./|/\.\.'
+URL_THREAT_PATTERN = re.compile(f'{_OPERATOR_PATTERN}|{_TRAVERSAL_PATTERN}|;', re.IGNORECASE)
+VALUE_THREAT_PATTERN = re.compile(f'{_OPERATOR_PATTERN}|{_TRAVERSAL_PATTERN}')
+BODY_THREAT_PATTERN = re.compile(VALUE_THREAT_PATTERN.pattern.encode())
+
+# JSON bodies larger than this are rejected rather than scanned
+MAX_SCANNED_BODY_BYTES = int(os.getenv("MAX_SCANNED_BODY_BYTES", str(64 * 1024)))
+
+# Routes that legitimately take larger JSON bodies: a full /scores/batch
+# (1000 scores with 100-character names) is up to about 200 KB
+BODY_LIMIT_OVERRIDES = {
+    "/scores/batch": int(os.getenv("MAX_BATCH_BODY_BYTES", str(256 * 1024))),
+}
+
 class APIKeyHeader(HTTPBearer):
     def __init__(self, auto_error: bool = True):
         super(APIKeyHeader, self).__init__(auto_error=auto_error)
@@ -35,32 +59,153 @@ class APIKeyHeader(HTTPBearer):
                 status_code=403, detail="Invalid authorization credentials."
             )
 
+# API key dependency shared by every router
+api_key_header = APIKeyHeader()
+
+def has_valid_api_key(request: Request) -> bool:
+    """The APIKeyHeader check as a plain test, for middleware (which cannot use dependencies)"""
+    scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+    return scheme == "Bearer" and credentials == API_KEY
+
 # Rate limiting implementation
+#
+# Sliding-window counter: each key keeps the request count for the current
+# fixed window and the one before it, and the rate is estimated as
+#   previous * (fraction of the previous window still in view) + current
+# which costs O(1) per request and a constant amount of memory per key.
+RATE_LIMIT_WINDOW_SECONDS = 60.0
+
+def _roll_window(window_index: int, current: int, previous: int, stored_index: int):
+    """Advance a (current, previous) counter pair to window_index"""
+    if stored_index == window_index:
+        return current, previous
+    if stored_index == window_index - 1:
+        return 0, current
+    return 0, 0
+
+class SharedRateLimitStore:
+    """
+    Fixed-size hash table of sliding-window counters in a memory-mapped file.
+
+    Every uvicorn worker on the host maps the same file, so they all enforce
+    one budget per IP. The table is split into buckets of SLOTS_PER_BUCKET
+    slots; a request locks only its own bucket (fcntl byte-range lock), so
+    workers serialise per bucket rather than on the whole table. When a
+    bucket is full the slot with the oldest window is recycled, which bounds
+    memory no matter how many addresses are seen.
+    """
+    SLOT = struct.Struct("<QqII")  # key hash, window index, current, previous
+    SLOTS_PER_BUCKET = 8
+
+    def __init__(self, path: str, buckets: int = 8192):
+        self.path = path
+        self.buckets = buckets
+        self.bucket_size = self.SLOT.size * self.SLOTS_PER_BUCKET
+        size = self.bucket_size * buckets
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size != size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+    @staticmethod
+    def _key_hash(key: str) -> int:
+        # Python's hash() is salted per process, so use a stable digest
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little") | 1  # 0 marks an empty slot
+
+    def hit(self, key: str, limit: int, window: float = RATE_LIMIT_WINDOW_SECONDS) -> bool:
+        """Record a request for key and return False if it is over the limit"""
+        now = time.time()
+        window_index = int(now // window)
+        elapsed_fraction = (now % window) / window
+
+        key_hash = self._key_hash(key)
+        bucket_offset = (key_hash % self.buckets) * self.bucket_size
+
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, self.bucket_size, bucket_offset)
+        try:
+            target = None
+            oldest = None
+            for slot in range(self.SLOTS_PER_BUCKET):
+                offset = bucket_offset + slot * self.SLOT.size
+                slot_hash, slot_index, current, previous = self.SLOT.unpack_from(self._map, offset)
+                if slot_hash == key_hash:
+                    target = (offset, slot_index, current, previous)
+                    break
+                if oldest is None or slot_index < oldest[1]:
+                    oldest = (offset, slot_index)
+
+            if target is None:
+                # Recycle the emptiest/stalest slot in the bucket
+                offset, current, previous = oldest[0], 0, 0
+            else:
+                offset = target[0]
+                current, previous = _roll_window(window_index, target[2], target[3], target[1])
+
+            allowed = previous * (1.0 - elapsed_fraction) + current < limit
+            if allowed:
+                current += 1
+            self.SLOT.pack_into(self._map, offset, key_hash, window_index, current, previous)
+            return allowed
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self.bucket_size, bucket_offset)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
 class RateLimiter:
-    def __init__(self, requests_per_minute: int = 60):
+    """
+    Per-IP sliding-window rate limiter.
+
+    Without a shared store, counters live in an LRU-ordered dict: every request
+    moves its key to the end, keys idle for more than a full window (which no
+    longer carry any state) are dropped from the front, and the dict never
+    grows past max_tracked_ips.
+    """
+    def __init__(self, requests_per_minute: int = 60, max_tracked_ips: int = 100000,
+                 store: Optional[SharedRateLimitStore] = None):
         self.requests_per_minute = requests_per_minute
-        self.request_history = {}
+        self.max_tracked_ips = max_tracked_ips
+        self.store = store
+        # ip -> [window index, current count, previous count]
+        self.request_history: "OrderedDict[str, List[int]]" = OrderedDict()
         
     async def check_rate_limit(self, ip_address: str) -> bool:
+        if self.store is not None:
+            return self.store.hit(ip_address, self.requests_per_minute)
+
         current_time = time.time()
-        
-        # Remove requests older than 1 minute
-        if ip_address in self.request_history:
-            self.request_history[ip_address] = [
-                timestamp for timestamp in self.request_history[ip_address]
-                if current_time - timestamp < 60
-            ]
+        window_index = int(current_time // RATE_LIMIT_WINDOW_SECONDS)
+        elapsed_fraction = (current_time % RATE_LIMIT_WINDOW_SECONDS) / RATE_LIMIT_WINDOW_SECONDS
+
+        entry = self.request_history.get(ip_address)
+        if entry is None:
+            entry = self.request_history[ip_address] = [window_index, 0, 0]
         else:
-            self.request_history[ip_address] = []
+            self.request_history.move_to_end(ip_address)
+            entry[1], entry[2] = _roll_window(window_index, entry[1], entry[2], entry[0])
+            entry[0] = window_index
+
+        self._evict_idle(window_index)
             
         # Check if rate limit is exceeded
-        if len(self.request_history[ip_address]) >= self.requests_per_minute:
+        if entry[2] * (1.0 - elapsed_fraction) + entry[1] >= self.requests_per_minute:
             return False
             
-        # Add current request timestamp
-        self.request_history[ip_address].append(current_time)
+        entry[1] += 1
         return True
 
+    def _evict_idle(self, window_index: int):
+        """Drop least recently used keys that are idle or over capacity"""
+        history = self.request_history
+        while history:
+            oldest_index = next(iter(history.values()))[0]
+            if oldest_index >= window_index - 1 and len(history) <= self.max_tracked_ips:
+                break
+            history.popitem(last=False)
+
 def log_injection_attempt(url_path: str, body_str: str = None):
     """Log potential injection attempts for demonstration purposes"""
     with open("injection_attempts.log", "a") as f:
@@ -71,32 +216,145 @@ def log_injection_attempt(url_path: str, body_str: str = None):
         f.write("---\n")
     print(f"Potential injection attempt logged: {url_path}")
 
+def scan_request_target(path: str, query_string: str) -> bool:
+    """Return True if the path or decoded query string looks like an injection attempt"""
+    if URL_THREAT_PATTERN.search(path):
+        return True
+    return bool(query_string) and URL_THREAT_PATTERN.search(unquote_plus(query_string)) is not None
+
+def is_json_request(request: Request) -> bool:
+    """
+    Whether FastAPI will parse the request body as JSON, by the same rule it
+    uses: no Content-Type at all, or a media type of application/json or
+    application/*+json, compared case-insensitively
+    """
+    if request.method not in ("POST", "PUT", "PATCH"):
+        return False
+    content_type = request.headers.get("content-type")
+    if not content_type:
+        return True
+    main_type, _, subtype = content_type.split(";", 1)[0].strip().lower().partition("/")
+    return main_type == "application" and (subtype == "json" or subtype.endswith("+json"))
+
+class RequestBodyTooLarge(Exception):
+    pass
+
+def body_limit(path: str) -> int:
+    """Largest JSON body accepted for a request path"""
+    return BODY_LIMIT_OVERRIDES.get(path.rstrip("/"), MAX_SCANNED_BODY_BYTES)
+
+async def read_json_body(request: Request, max_bytes: int = MAX_SCANNED_BODY_BYTES) -> bytes:
+    """
+    Reads a JSON request body chunk by chunk, stopping once it exceeds max_bytes.
+
+    The body is then replayed to the route handler, so downstream code can
+    still call request.json() as usual.
+    """
+    declared_length = request.headers.get("content-length")
+    if declared_length and declared_length.isdigit() and int(declared_length) > max_bytes:
+        raise RequestBodyTooLarge()
+
+    chunks = []
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise RequestBodyTooLarge()
+        chunks.append(chunk)
+    body = b"".join(chunks)
+
+    original_receive = request._receive
+    replayed = False
+
+    async def replay_receive():
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await original_receive()
+
+    request._receive = replay_receive
+    return body
+
+def contains_threat(document: Any) -> bool:
+    """
+    Return True if any key or string value in a decoded JSON document
+    contains a MongoDB operator or traversal sequence.
+
+    Uses the same explicit-stack walk as sanitize_mongo_query, so deeply
+    nested payloads cannot exhaust the recursion limit.
+    """
+    pending = [document]
+    while pending:
+        value = pending.pop()
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if VALUE_THREAT_PATTERN.search(key):
+                    return True
+                pending.append(item)
+        elif isinstance(value, list):
+            pending.extend(value)
+        elif isinstance(value, str) and VALUE_THREAT_PATTERN.search(value):
+            return True
+    return False
+
+def scan_request_body(body: bytes) -> bool:
+    """
+    Return True if a JSON body contains a MongoDB operator or traversal sequence.
+
+    Without backslashes the raw bytes read the same as the decoded strings,
+    so one regex pass is enough. Escapes such as \\u0024 can hide an operator
+    from that pass, so those bodies are decoded and their keys and strings
+    scanned instead.
+    """
+    if b"\\" not in body:
+        return BODY_THREAT_PATTERN.search(body) is not None
+    try:
+        document = json.loads(body)
+    except (ValueError, RecursionError):
+        # Not valid JSON: the route will reject it, but scan what was sent
+        return BODY_THREAT_PATTERN.search(body) is not None
+    return contains_threat(document)
+
 # Input sanitization for MongoDB
 def sanitize_mongo_query(query_dict: Dict[str, Any]) -> Dict[str, Any]:
-    """Sanitize MongoDB query to prevent NoSQL injection"""
+    """
+    Sanitize MongoDB query to prevent NoSQL injection.
+
+    Walks the document with an explicit stack rather than recursion, so deeply
+    nested payloads cannot exhaust the interpreter's recursion limit.
+    """
     if not isinstance(query_dict, dict):
         return query_dict
         
     sanitized_query = {}
+    pending = [(query_dict, sanitized_query)]
     
-    for key, value in query_dict.items():
-        # Check for MongoDB operator keys
-        if key.startswith('$'):
-            continue
-            
-        # Recursive sanitization for nested dictionaries
-        if isinstance(value, dict):
-            sanitized_query[key] = sanitize_mongo_query(value)
-        elif isinstance(value, list):
-            sanitized_query[key] = [
-                sanitize_mongo_query(item) if isinstance(item, dict) else item
-                for item in value
-            ]
-        else:
-            # Check for string values that might contain injection attempts
-            if isinstance(value, str):
-                if re.search(r'\$where|\$ne|\$gt|\$lt|\$regex|\$exists|\.\.\/|\/\.\.', value):
+    while pending:
+        source, target = pending.pop()
+        for key, value in source.items():
+            # Check for MongoDB operator keys
+            if key.startswith('$'):
+                continue
+                
+            # Nested dictionaries are queued instead of recursed into
+            if isinstance(value, dict):
+                target[key] = {}
+                pending.append((value, target[key]))
+            elif isinstance(value, list):
+                items = []
+                for item in value:
+                    if isinstance(item, dict):
+                        child = {}
+                        pending.append((item, child))
+                        items.append(child)
+                    else:
+                        items.append(item)
+                target[key] = items
+            else:
+                # Check for string values that might contain injection attempts
+                if isinstance(value, str) and VALUE_THREAT_PATTERN.search(value):
                     continue
-            sanitized_query[key] = value
+                target[key] = value
             
-    return sanitized_query
\ No newline at end of file
+    return sanitized_query
@@ -0,0 +1,205 @@
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import BinaryIO
+from config import blobs_collection
+import asyncio
+import hashlib
+import os
+import tempfile
+
+# Root directory of the on-disk blob store
+ASSET_STORAGE_DIR = os.getenv("ASSET_STORAGE_DIR", "asset_store")
+
+# Uploads are copied in fixed-size chunks so memory use stays flat
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Per asset type upload size caps, in bytes
+MAX_UPLOAD_BYTES = {
+    "sprites": int(os.getenv("MAX_SPRITE_UPLOAD_BYTES", str(10 * 1024 * 1024))),
+    "audio": int(os.getenv("MAX_AUDIO_UPLOAD_BYTES", str(100 * 1024 * 1024))),
+}
+
+# Orphaned blobs are kept for a grace period before the collector removes them
+BLOB_GC_INTERVAL_SECONDS = float(os.getenv("BLOB_GC_INTERVAL_SECONDS", "300"))
+BLOB_GC_GRACE_SECONDS = float(os.getenv("BLOB_GC_GRACE_SECONDS", "3600"))
+
+# How long retain() waits for the collector to finish with a blob it is reclaiming
+RETAIN_RETRIES = 20
+RETAIN_RETRY_DELAY = 0.05
+
+class UploadTooLarge(Exception):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds the {max_bytes} byte limit")
+        self.max_bytes = max_bytes
+
+@dataclass
+class IngestedBlob:
+    """An upload that has been streamed to a temp file but not yet committed"""
+    temp_path: str
+    size: int
+    sha256: str
+    extension: str
+
+@dataclass
+class StoredBlob:
+    """A blob referenced by an asset document"""
+    blob_key: str
+    size: int
+    sha256: str
+    deduplicated: bool
+
+class BlobStore:
+    """
+    Content-addressed on-disk store for uploaded asset bytes.
+
+    Uploads are streamed into a temp file inside the store (so the final
+    rename never crosses filesystems) and hashed on the way through. Blobs
+    live under their SHA-256, and a record in blobs_collection counts how
+    many asset documents point at each one: re-uploading identical bytes
+    just bumps the count, and deletes decrement it. Blobs whose count drops
+    to zero are reclaimed by collect_orphaned_blobs() after a grace period.
+    """
+    def __init__(self, root: str, records):
+        self.root = root
+        self.temp_dir = os.path.join(root, "tmp")
+        self.records = records
+
+    @staticmethod
+    def key_for(sha256: str) -> str:
+        return f"blobs/{sha256[:2]}/{sha256}"
+
+    def path_for(self, blob_key: str) -> str:
+        return os.path.join(self.root, blob_key)
+
+    def _copy_to_temp(self, source: BinaryIO, max_bytes: int):
+        os.makedirs(self.temp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.temp_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as target:
+                while chunk := source.read(UPLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise UploadTooLarge(max_bytes)
+                    digest.update(chunk)
+                    target.write(chunk)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return temp_path, size, digest.hexdigest()
+
+    async def ingest(self, upload: UploadFile, max_bytes: int) -> IngestedBlob:
+        """Stream an UploadFile to a temp file, enforcing max_bytes and hashing it"""
+        await upload.seek(0)
+        # The whole copy runs in one worker thread instead of hopping per chunk
+        temp_path, size, sha256 = await run_in_threadpool(self._copy_to_temp, upload.file, max_bytes)
+        extension = upload.filename.rsplit(".", 1)[-1].lower()
+        return IngestedBlob(temp_path=temp_path, size=size, sha256=sha256, extension=extension)
+
+    def _move_into_place(self, blob: IngestedBlob, blob_key: str) -> bool:
+        final_path = self.path_for(blob_key)
+        if os.path.exists(final_path):
+            self.discard(blob)
+            return False
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        with open(blob.temp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(blob.temp_path, final_path)
+        return True
+
+    async def retain(self, blob: IngestedBlob) -> StoredBlob:
+        """
+        Add a reference to an ingested blob, storing its bytes only if no
+        identical blob exists yet.
+        """
+        from pymongo.errors import DuplicateKeyError
+
+        blob_key = self.key_for(blob.sha256)
+        for _ in range(RETAIN_RETRIES):
+            try:
+                result = await self.records.update_one(
+                    # Records being reclaimed are excluded, so the upsert hits a
+                    # duplicate key until the collector has finished with them
+                    {"_id": blob.sha256, "collecting": {"$ne": True}},
+                    {
+                        "$inc": {"refcount": 1},
+                        "$unset": {"orphaned_at": ""},
+                        "$setOnInsert": {"blob_key": blob_key, "size": blob.size, "created_at": datetime.now()}
+                    },
+                    upsert=True
+                )
+                break
+            except DuplicateKeyError:
+                await asyncio.sleep(RETAIN_RETRY_DELAY)
+        else:
+            self.discard(blob)
+            raise RuntimeError(f"Blob {blob.sha256} is being reclaimed, try again")
+
+        # Always make sure the bytes are on disk, even for an existing record:
+        # a concurrent upload of the same content may not have renamed yet
+        stored = await run_in_threadpool(self._move_into_place, blob, blob_key)
+        return StoredBlob(blob_key=blob_key, size=blob.size, sha256=blob.sha256,
+                          deduplicated=result.upserted_id is None and not stored)
+
+    async def release(self, sha256: str):
+        """Drop a reference to a blob, marking it orphaned when none remain"""
+        from pymongo import ReturnDocument
+
+        record = await self.records.find_one_and_update(
+            {"_id": sha256},
+            {"$inc": {"refcount": -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if record is not None and record["refcount"] <= 0:
+            await self.records.update_one(
+                {"_id": sha256, "refcount": {"$lte": 0}},
+                {"$set": {"orphaned_at": datetime.now()}}
+            )
+
+    def discard(self, blob: IngestedBlob):
+        """Drop an ingested blob that will not be committed"""
+        try:
+            os.unlink(blob.temp_path)
+        except FileNotFoundError:
+            pass
+
+    def remove(self, blob_key: str):
+        try:
+            os.unlink(self.path_for(blob_key))
+        except FileNotFoundError:
+            pass
+
+    async def collect_orphaned_blobs(self, grace_seconds: float = BLOB_GC_GRACE_SECONDS) -> int:
+        """Delete blobs that have had no references for longer than grace_seconds"""
+        cutoff = datetime.now() - timedelta(seconds=grace_seconds)
+        reclaimed = 0
+        async for record in self.records.find({"refcount": {"$lte": 0}, "orphaned_at": {"$lt": cutoff}}):
+            # Claim the record first so a concurrent retain() waits instead of
+            # resurrecting a blob whose file is about to be removed
+            claimed = await self.records.find_one_and_update(
+                {"_id": record["_id"], "refcount": {"$lte": 0}},
+                {"$set": {"collecting": True}}
+            )
+            if claimed is None:
+                continue
+            await run_in_threadpool(self.remove, claimed["blob_key"])
+            await self.records.delete_one({"_id": record["_id"]})
+            reclaimed += 1
+        return reclaimed
+
+    async def run_collector(self, interval: float = BLOB_GC_INTERVAL_SECONDS):
+        """Background task that periodically reclaims orphaned blobs"""
+        while True:
+            try:
+                reclaimed = await self.collect_orphaned_blobs()
+                if reclaimed:
+                    print(f"Blob collector reclaimed {reclaimed} orphaned blobs")
+            except Exception as e:
+                print(f"Blob collector failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+# Shared blob store instance
+blob_store = BlobStore(ASSET_STORAGE_DIR, blobs_collection)
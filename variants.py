@@ -0,0 +1,64 @@
+from typing import Optional
+from workers import run_in_process, SingleFlight
+from disk_cache import DiskLRU
+import os
+import tempfile
+
+# Downscale sizes (longest edge, in pixels) the API will produce
+VARIANT_SIZES = (16, 32, 64, 128, 256, 512)
+
+# Disk budget for generated variants; least recently used files go first
+VARIANT_CACHE_MAX_BYTES = int(os.getenv("VARIANT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+def render_variant(source_path: str, size: int, output_path: str) -> int:
+    """
+    Downscale an image so its longest edge is at most size and save it as PNG.
+
+    Runs in a worker process. Images already within the size are re-encoded
+    rather than upscaled. The file is written through a temp file and renamed
+    into place. Returns the size of the written file.
+    """
+    from PIL import Image
+
+    with Image.open(source_path) as image:
+        image = image.convert("RGBA")
+        image.thumbnail((size, size), Image.LANCZOS)
+
+        directory = os.path.dirname(output_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".png.part")
+        with os.fdopen(fd, "wb") as f:
+            image.save(f, "PNG")
+    os.replace(temp_path, output_path)
+    return os.path.getsize(output_path)
+
+class VariantCache:
+    """
+    Bounded on-disk cache of derived sprite variants.
+
+    Variants are keyed by the source blob's content hash, so duplicate
+    sprites share them. A DiskLRU keeps the directory, which every worker
+    shares, within max_bytes by evicting the least recently served variants.
+    Concurrent requests for a missing variant share one render job.
+    """
+    def __init__(self, root: str, max_bytes: int = VARIANT_CACHE_MAX_BYTES):
+        self.root = root
+        self.files = DiskLRU(root, max_bytes)
+        self._renders = SingleFlight()
+
+    def path_for(self, sha256: str, size: int) -> str:
+        return os.path.join(self.root, sha256[:2], f"{sha256}_{size}.png")
+
+    async def get(self, sha256: str, source_path: str, size: int) -> Optional[str]:
+        """Return the path of a variant, rendering it in the process pool if needed"""
+        await self.files.ensure_loaded()
+        path = self.path_for(sha256, size)
+        if await self.files.hit(path):
+            return path
+
+        async def render():
+            written = await run_in_process(render_variant, source_path, size, path)
+            await self.files.add(path, written)
+            return path
+
+        return await self._renders.run(path, render)
@@ -0,0 +1,99 @@
+from fastapi import Request
+from starlette.responses import Response
+from bson import ObjectId
+from typing import Any, Dict, Optional, Tuple
+from config import versions_collection
+from responses import etag_matches
+import asyncio
+import os
+
+# How often each worker picks up version bumps made by other workers
+VERSION_POLL_SECONDS = float(os.getenv("VERSION_POLL_SECONDS", "1"))
+
+class CollectionVersions:
+    """
+    Per-collection change counters used as ETags.
+
+    Upload and delete handlers bump a collection's counter with one $inc on
+    a small document in versions_collection; every worker polls those
+    documents, so its ETags follow other workers' changes within a poll
+    interval. A conditional request whose ETag still matches is answered
+    with 304 without touching the asset collection at all.
+
+    Each counter document carries a random epoch set when it is created,
+    so ETags never repeat if the counters are reset. Until a worker has
+    read a counter (or while one of its bumps has not been written), it
+    serves full responses without an ETag.
+    """
+    def __init__(self, records, names: Tuple[str, ...] = ("sprites", "audio")):
+        self.records = records
+        self.names = names
+        self.versions: Dict[str, Tuple[str, int]] = {}
+        self.pending: Dict[str, int] = {name: 0 for name in names}
+
+    def etag(self, name: str, variant: str = "") -> Optional[str]:
+        """Weak ETag for the current state of a collection, or None if unknown"""
+        current = self.versions.get(name)
+        if current is None or self.pending[name]:
+            return None
+        epoch, version = current
+        return f'W/"{name}-{epoch}-{version}{variant}"'
+
+    def _observe(self, document: Dict[str, Any]):
+        current = self.versions.get(document["_id"])
+        seen = (document["epoch"], document.get("version", 0))
+        if current is None or current[0] != seen[0] or seen[1] > current[1]:
+            self.versions[document["_id"]] = seen
+
+    async def _write(self, name: str):
+        from pymongo import ReturnDocument
+
+        count, self.pending[name] = self.pending[name], 0
+        try:
+            document = await self.records.find_one_and_update(
+                {"_id": name},
+                {"$inc": {"version": count}, "$setOnInsert": {"epoch": str(ObjectId())}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            # Retried by the poller; ETags stay off for this collection until then
+            self.pending[name] += count
+            print(f"Failed to bump {name} version: {str(e)}")
+            return
+        self._observe(document)
+
+    async def bump(self, name: str):
+        """Record that a collection changed"""
+        self.pending[name] += 1
+        await self._write(name)
+
+    async def refresh(self):
+        """Write any failed bumps, then read every counter"""
+        for name in self.names:
+            if self.pending[name]:
+                await self._write(name)
+        async for document in self.records.find({"_id": {"$in": list(self.names)}}):
+            self._observe(document)
+        for name in self.names:
+            if name not in self.versions and not self.pending[name]:
+                # First run against this database: create the counter
+                await self._write(name)
+
+    async def run_poller(self, interval: float = VERSION_POLL_SECONDS):
+        """Background task that keeps this worker's counters current"""
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Version poll failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+def not_modified(request: Request, etag: Optional[str]) -> Optional[Response]:
+    """304 response if the request's If-None-Match matches etag"""
+    if etag is not None and etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+# Shared version counters
+collection_versions = CollectionVersions(versions_collection)
@@ -0,0 +1,73 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import asyncio
+import multiprocessing
+import os
+
+# CPU-bound asset processing (atlas packing, image resizing) runs here so it
+# never blocks the event loop or contends for the GIL
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", str(min(4, os.cpu_count() or 1))))
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Create the shared process pool on first use"""
+    global _process_pool
+    if _process_pool is None:
+        # spawn rather than fork: forking a process with a running event loop
+        # and driver threads is not safe
+        _process_pool = ProcessPoolExecutor(
+            max_workers=WORKER_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+async def run_in_process(fn: Callable, *args) -> Any:
+    """Run a picklable top-level function in the shared process pool"""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_process_pool(), fn, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed); start a fresh pool for the next call
+        shutdown_process_pool()
+        raise
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one.
+
+    The first caller for a key runs the work; anyone else asking for that key
+    while it is in flight awaits the same future instead of repeating it.
+    """
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    async def run(self, key: Hashable, work: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._in_flight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await work()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._in_flight[key]